@@ -2,6 +2,9 @@ import os
 import sys
 import json
 import time
+import threading
+import collections
+import tempfile
 import subprocess
 import speech_recognition as sr
 from dotenv import load_dotenv
@@ -15,6 +18,12 @@ try:
 except (ImportError, OSError):
     GPIO_AVAILABLE = False
 
+try:
+    import webrtcvad
+    VAD_AVAILABLE = True
+except ImportError:
+    VAD_AVAILABLE = False
+
 # Get absolute path of the script directory
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -26,22 +35,43 @@ if not API_KEY:
     print("❌ Error: GEMINI_API_KEY not found in .env")
     sys.exit(1)
 
-# Initialize Gemini Client
-client = genai.Client(api_key=API_KEY)
+# 15 s timeout: past that the user hears "связь лагает" instead of waiting in silence
+GEMINI_TIMEOUT_MS = 15_000
+client = genai.Client(api_key=API_KEY, http_options=types.HttpOptions(timeout=GEMINI_TIMEOUT_MS))
+
+def prewarm_client():
+    """DNS + TLS to Gemini, run while the greeting plays so the first question skips the handshake."""
+    try:
+        client.models.get(model="gemini-2.5-flash")
+    except Exception:
+        pass
 
 MEMORY_FILE = os.path.join(SCRIPT_DIR, "memory.json")
 ALSA_DEVICE = "bluealsa" # For Pi Lite Bluetooth
 BUTTON_PIN = 17          # GPIO 17 (Pin 11)
 TEMP_WAV = os.path.join(SCRIPT_DIR, "input.wav")
 
+# VAD endpointing (webrtcvad)
+SAMPLE_RATE = 16000
+VAD_FRAME_MS = 30        # webrtcvad accepts 10/20/30 ms frames
+VAD_SILENCE_FRAMES = 10  # 10 x 30 ms = 300 ms of silence ends the phrase
+VAD_PREROLL_FRAMES = 8   # 240 ms kept from before speech onset, so the first syllable survives
+
+MAX_PROMPT_FACTS = 30    # Only the most recent facts go into the prompt
+
 import datetime
 
 # ... (imports remain)
 
 # --- MEMORY FUNCTIONS ---
+def _index_memory(data):
+    """Builds the in-memory set of fact texts used for O(1) dedup."""
+    data["_text_index"] = {f["text"] if isinstance(f, dict) else f for f in data["user_facts"]}
+    return data
+
 def load_memory():
     if not os.path.exists(MEMORY_FILE):
-        return {"user_facts": []}
+        return _index_memory({"user_facts": []})
     try:
         with open(MEMORY_FILE, 'r', encoding='utf-8') as f:
             data = json.load(f)
@@ -50,46 +80,62 @@ def load_memory():
                 today = datetime.date.today().isoformat()
                 data["user_facts"] = [{"text": f, "created_at": today} for f in data["user_facts"]]
                 save_memory(data)
-            return data
+            return _index_memory(data)
     except json.JSONDecodeError:
-        return {"user_facts": []}
+        return _index_memory({"user_facts": []})
 
 def save_memory(memory_data):
+    # Keys starting with "_" are runtime caches, never persisted
+    data = {k: v for k, v in memory_data.items() if not k.startswith("_")}
     with open(MEMORY_FILE, 'w', encoding='utf-8') as f:
-        json.dump(memory_data, f, ensure_ascii=False, indent=2)
+        json.dump(data, f, ensure_ascii=False, indent=2)
 
 # --- AUDIO FUNCTIONS ---
 TTS_SPEED = 1.25 # Speed multiplier (1.0 = normal, 1.5 = fast)
+# RAM-backed tmpfs on Pi: no SD-card writes for throwaway TTS files
+TTS_TMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+def _pipe_to_aplay(mp3_filename, device=None):
+    """Decodes MP3 with ffmpeg straight into aplay's stdin (no WAV on disk)."""
+    aplay_cmd = (['aplay', '-q'] + (['-D', device] if device else [])
+                 + ['--period-time=40000', '--buffer-time=120000', '-'])
+    decoder = subprocess.Popen(
+        ["ffmpeg", "-loglevel", "quiet", "-fflags", "nobuffer", "-flags", "low_delay",
+         "-probesize", "32", "-analyzeduration", "0",
+         "-i", mp3_filename, "-f", "wav", "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    player = subprocess.Popen(aplay_cmd, stdin=decoder.stdout,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    decoder.stdout.close()  # Let ffmpeg get SIGPIPE if aplay exits early
+    player.wait()
+    decoder.wait()
+    if decoder.returncode != 0 or player.returncode != 0:
+        raise subprocess.CalledProcessError(player.returncode or decoder.returncode, aplay_cmd)
 
 def speak(text, lang='ru'):
     """TTS with cross-platform support and SPEED CONTROL."""
-    mp3_filename = os.path.join(SCRIPT_DIR, "output_tts.mp3")
-    wav_filename = os.path.join(SCRIPT_DIR, "output_tts.wav")
+    # Unique file per call, so overlapping speak() calls never clash
+    mp3 = tempfile.NamedTemporaryFile(suffix=".mp3", dir=TTS_TMP_DIR, delete=False)
+    mp3_filename = mp3.name
 
     try:
         # 1. Generate MP3
         tts = gTTS(text=text, lang=lang)
-        tts.save(mp3_filename)
+        tts.write_to_fp(mp3)
+        mp3.close()
         
         if sys.platform == "darwin": # macOS
             subprocess.run(['afplay', '--rate', str(TTS_SPEED), mp3_filename], check=True)
             
         else: # Linux (Raspberry Pi)
-            # 1. Try converting to WAV using ffmpeg (Most robust for Pi)
+            # ffmpeg | aplay in one pipeline (Most robust for Pi)
             try:
-                subprocess.run(
-                    ["ffmpeg", "-y", "-i", mp3_filename, wav_filename],
-                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True
-                )
-                
-                # 2. Play using aplay via BlueALSA
                 try:
-                    subprocess.run(['aplay', '-D', 'bluealsa', wav_filename], 
-                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+                    _pipe_to_aplay(mp3_filename, ALSA_DEVICE)
                 except:
                     # Fallback to default device
-                    subprocess.run(['aplay', wav_filename], 
-                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+                    _pipe_to_aplay(mp3_filename)
                                  
             except Exception as e:
                 print(f"⚠️ ffmpeg/aplay error: {e}")
@@ -103,54 +149,38 @@ def speak(text, lang='ru'):
         print(f"❌ TTS Error: {e}")
     
     finally:
-        if os.path.exists(mp3_filename): os.remove(mp3_filename)
-        if os.path.exists(wav_filename): os.remove(wav_filename)
+        mp3.close()
+        try:
+            os.unlink(mp3_filename)
+        except FileNotFoundError:
+            pass
 
 # --- AI LOGIC ---
-def ai_memory_observer(user_input, current_memory):
-    """AI #2: Observer (Extracts facts)."""
-    sys_prompt = """
-    Ты - ИИ-Архивариус. Твоя задача - извлекать факты о пользователе.
-    Если пользователь сообщает что-то о себе, верни JSON: {"new_fact": "факт"}.
-    Иначе верни: {}
-    """
-    try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            config=types.GenerateContentConfig(
-                system_instruction=sys_prompt,
-                response_mime_type="application/json"
-            ),
-            contents=user_input
-        )
-        if response.text:
-            data = json.loads(response.text)
-            new_fact_text = data.get("new_fact")
-            
-            if new_fact_text:
-                # Check for duplicates (by text)
-                existing_texts = [f["text"] for f in current_memory["user_facts"]]
-                if new_fact_text not in existing_texts:
-                    today = datetime.date.today().isoformat()
-                    new_entry = {"text": new_fact_text, "created_at": today}
-                    
-                    print(f"🧠 [Memory]: Запомнил -> {new_fact_text} ({today})")
-                    current_memory["user_facts"].append(new_entry)
-                    save_memory(current_memory)
-    except Exception as e:
-        print(f"⚠️ Memory Error: {e}")
+def remember_fact(current_memory, new_fact_text, today_iso):
+    """Appends a new fact to memory (skips duplicates by text)."""
+    if new_fact_text in current_memory["_text_index"]:
+        return
+    current_memory["_text_index"].add(new_fact_text)
+    new_entry = {"text": new_fact_text, "created_at": today_iso}
 
-def ai_chat_friend(user_input, memory_data):
-    """AI #1: Funny Friend (Chat)."""
-    
-    # Format facts with dates
-    facts_list = "\n".join([f"- [{f['created_at']}] {f['text']}" for f in memory_data["user_facts"]])
+    print(f"🧠 [Memory]: Запомнил -> {new_fact_text} ({today_iso})")
+    current_memory["user_facts"].append(new_entry)
+    current_memory["_facts_str"] = None  # Invalidate prompt cache
+    save_memory(current_memory)
+
+def ai_chat_friend(user_input, memory_data, today_iso):
+    """AI Bro: answers AND extracts facts in a single JSON call."""
     
-    current_date = datetime.date.today().strftime("%Y-%m-%d")
+    # Format the latest facts with dates (cached until a new fact is added).
+    # Bounded window keeps prompt size (and latency) flat as memory grows.
+    if memory_data.get("_facts_str") is None:
+        recent_facts = memory_data["user_facts"][-MAX_PROMPT_FACTS:]
+        memory_data["_facts_str"] = "\n".join(f"- [{f['created_at']}] {f['text']}" for f in recent_facts)
+    facts_list = memory_data["_facts_str"]
     
     sys_prompt = f"""
     Ты - мой лучший кент, ИИ-братан.
-    СЕГОДНЯШНЯЯ ДАТА: {current_date}
+    СЕГОДНЯШНЯЯ ДАТА: {today_iso}
     
     Стиль: на "ты", с юмором, сленг (в меру), кратко (для озвучки).
     Твои ответы должны быть живыми, не роботскими.
@@ -160,17 +190,70 @@ def ai_chat_friend(user_input, memory_data):
     
     Используй память и даты! Если факт старый (например, год назад), можешь спросить "как там с этим?".
     Если факт свежий (сегодня/вчера) - реагируй актуально.
+    
+    ЕЩЕ ЗАДАЧА: если я сообщаю что-то новое о себе, извлеки это как факт.
+    Не выдумывай ничего. Только то, что я сказал.
+    
+    ФОРМАТ ОТВЕТА (JSON):
+    {{
+        "response": "Текст ответа для озвучки",
+        "new_fact": "Текст нового факта (или null, если ничего нового)"
+    }}
     """
     try:
         response = client.models.generate_content(
             model="gemini-2.5-flash",
-            config=types.GenerateContentConfig(system_instruction=sys_prompt),
+            config=types.GenerateContentConfig(
+                system_instruction=sys_prompt,
+                response_mime_type="application/json"
+            ),
             contents=user_input
         )
-        return response.text
+        data = json.loads(response.text)
+        new_fact_text = data.get("new_fact")
+        if new_fact_text:
+            remember_fact(memory_data, new_fact_text, today_iso)
+        return data.get("response", "Не понял, бро.")
     except Exception as e:
         return "Бро, связь лагает..."
 
+def record_until_silence(mic_device, is_held):
+    """
+    Streams raw PCM from arecord through WebRTC VAD.
+    Stops on button release OR after 300 ms of silence following speech.
+    """
+    vad = webrtcvad.Vad(2)
+    frame_bytes = SAMPLE_RATE * VAD_FRAME_MS // 1000 * 2  # 16-bit mono
+    cmd = ["arecord", "-q", "-D", mic_device, "-f", "S16_LE", "-r", str(SAMPLE_RATE), "-c", "1", "-t", "raw"]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    preroll = collections.deque(maxlen=VAD_PREROLL_FRAMES)
+    frames = []
+    speech_started = False
+    silent_frames = 0
+    try:
+        while is_held():
+            frame = process.stdout.read(frame_bytes)
+            if len(frame) < frame_bytes:
+                break
+            if vad.is_speech(frame, SAMPLE_RATE):
+                if not speech_started:
+                    frames.extend(preroll)  # VAD fires a few frames late
+                speech_started = True
+                silent_frames = 0
+            elif speech_started:
+                silent_frames += 1
+            if speech_started:
+                frames.append(frame)
+                if silent_frames >= VAD_SILENCE_FRAMES:
+                    break
+            else:
+                preroll.append(frame)
+    finally:
+        process.terminate()
+        process.wait()
+    return b"".join(frames)
+
 # --- MAIN LOOP ---
 def list_microphones():
     """Lists all available microphones."""
@@ -195,8 +278,10 @@ def main():
     else:
         print("🔹 Using Default Microphone")
 
+    threading.Thread(target=prewarm_client, daemon=True).start()
     memory = load_memory()
     r = sr.Recognizer()
+    r.dynamic_energy_threshold = False  # Audio is pre-recorded, no adaptive loop needed
     
     # Get Mic Device for arecord (e.g., "hw:1,0")
     mic_device = os.getenv("MIC_DEVICE", "hw:1,0")
@@ -220,16 +305,24 @@ def main():
         print("⚠️ GPIO not available. Falling back to ENTER key.")
         print("👉 Press ENTER to speak, then ENTER again to stop.")
 
+    # VAD needs a button we can poll without blocking (not ENTER)
+    use_vad = VAD_AVAILABLE and GPIO_AVAILABLE and sys.platform != "darwin"
+    if use_vad:
+        print("✅ VAD endpointing: pause to finish, no need to release.")
+
     try:
         while True:
             if GPIO_AVAILABLE:
                 if not USE_POLLING:
+                    button.wait_for_release()  # VAD may have ended the last turn mid-hold
                     button.wait_for_press()
                 else:
                     # Manual polling if edge detection fails
                     import RPi.GPIO as GPIO
                     GPIO.setmode(GPIO.BCM)
                     GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+                    while GPIO.input(BUTTON_PIN) == GPIO.LOW:
+                        time.sleep(0.05)
                     while GPIO.input(BUTTON_PIN) == GPIO.HIGH:
                         time.sleep(0.05)
             else:
@@ -237,48 +330,59 @@ def main():
 
             # --- START RECORDING ---
             print("🎤 Listening...")
-            cmd = ["arecord", "-D", mic_device, "-f", "S16_LE", "-r", "16000", "-c", "1", TEMP_WAV]
-            
-            if sys.platform == "darwin":
-                print("☁️ (Simulating recording on macOS...)")
-                time.sleep(2)
-                process = None
-            else:
-                process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            audio = None
 
-            if GPIO_AVAILABLE:
+            if use_vad:
                 if not USE_POLLING:
-                    button.wait_for_release()
+                    is_held = lambda: button.is_pressed
                 else:
-                    import RPi.GPIO as GPIO
-                    while GPIO.input(BUTTON_PIN) == GPIO.LOW:
-                        time.sleep(0.05)
+                    is_held = lambda: GPIO.input(BUTTON_PIN) == GPIO.LOW
+                raw = record_until_silence(mic_device, is_held)
+                if raw:
+                    audio = sr.AudioData(raw, SAMPLE_RATE, 2)
             else:
-                input("🎤 ЗАПИСЬ... [ENTER] Остановить")
+                cmd = ["arecord", "-D", mic_device, "-f", "S16_LE", "-r", "16000", "-c", "1", TEMP_WAV]
+                
+                if sys.platform == "darwin":
+                    print("☁️ (Simulating recording on macOS...)")
+                    time.sleep(2)
+                    process = None
+                else:
+                    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+                if GPIO_AVAILABLE:
+                    if not USE_POLLING:
+                        button.wait_for_release()
+                    else:
+                        import RPi.GPIO as GPIO
+                        while GPIO.input(BUTTON_PIN) == GPIO.LOW:
+                            time.sleep(0.05)
+                else:
+                    input("🎤 ЗАПИСЬ... [ENTER] Остановить")
 
-            # --- STOP RECORDING ---
-            if process:
-                process.terminate()
-                process.wait()
+                # --- STOP RECORDING ---
+                if process:
+                    process.terminate()
+                    process.wait()
             print("⏳ Processing...")
 
             # --- STT ---
             try:
-                if os.path.exists(TEMP_WAV):
+                if audio is None and os.path.exists(TEMP_WAV):
                     with sr.AudioFile(TEMP_WAV) as source:
                         audio = r.record(source)
+
+                if audio is not None:
                     user_text = r.recognize_google(audio, language="ru-RU")
                     print(f"🗣️  You: {user_text}")
 
                     if user_text:
-                        # 1. Memory AI
-                        ai_memory_observer(user_text, memory)
-                        
-                        # 2. Chat AI
-                        ai_response = ai_chat_friend(user_text, memory)
+                        # 1. Chat AI (also saves new facts)
+                        today_iso = datetime.date.today().isoformat()
+                        ai_response = ai_chat_friend(user_text, memory, today_iso)
                         print(f"🤖 AI: {ai_response}")
                         
-                        # 3. Speak Response
+                        # 2. Speak Response
                         speak(ai_response, 'ru')
                 else:
                     print("⚠️ No audio recorded.")
@@ -2,9 +2,12 @@ import os
 import json
 import sys
 import time
+import random
+import threading
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
+from google.genai import errors
 
 # Get absolute path of the script directory
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -17,11 +20,33 @@ if not API_KEY:
     print("❌ Error: GEMINI_API_KEY not found in .env")
     sys.exit(1)
 
-# Initialize Client
-client = genai.Client(api_key=API_KEY)
+# 15 s timeout: a hung request ends in the error reply instead of freezing the chat prompt
+GEMINI_TIMEOUT_MS = 15_000
+client = genai.Client(api_key=API_KEY, http_options=types.HttpOptions(timeout=GEMINI_TIMEOUT_MS))
+
+def prewarm_client():
+    """Connects to Gemini in the background while the user types the first message."""
+    def _ping():
+        try:
+            client.models.get(model="gemini-2.5-flash")
+        except Exception:
+            pass
+    threading.Thread(target=_ping, daemon=True).start()
 
 MEMORY_FILE = os.path.join(SCRIPT_DIR, "memory.json")
 
+# Retry policy for overloaded / rate-limited model
+MAX_RETRIES = 5
+RETRYABLE_CODES = (429, 503)
+
+def is_retryable(error):
+    """Only overload (503) and rate-limit (429) API errors are worth retrying."""
+    return isinstance(error, errors.APIError) and error.code in RETRYABLE_CODES
+
+def backoff_delay(attempt):
+    """Exponential back-off with jitter, capped at 30s."""
+    return min(30, (2 ** attempt) + random.uniform(0, 0.5))
+
 def load_memory():
     """Loads memory from JSON file."""
     if not os.path.exists(MEMORY_FILE):
@@ -65,9 +90,8 @@ def ai_memory_observer(user_input, current_memory):
     Не выдумывай ничего. Только то, что сказал пользователь.
     """
 
-    # Retry logic for 503 errors
-    max_retries = 3
-    for attempt in range(max_retries):
+    # Retry logic for 503/429 errors
+    for attempt in range(MAX_RETRIES):
         try:
             response = client.models.generate_content(
                 model="gemini-2.5-flash", # Using a fast model
@@ -92,10 +116,9 @@ def ai_memory_observer(user_input, current_memory):
             return False # Success but no new fact
             
         except Exception as e:
-            if "503" in str(e) or "overloaded" in str(e).lower():
-                if attempt < max_retries - 1:
-                    time.sleep(2)
-                    continue
+            if is_retryable(e) and attempt < MAX_RETRIES - 1:
+                time.sleep(backoff_delay(attempt))
+                continue
             print(f"⚠️ Memory AI Error: {e}")
             return False
 
@@ -116,9 +139,8 @@ def ai_chat_friend(user_input, memory_data):
     {facts_list}
     """
 
-    # Retry logic for 503 errors
-    max_retries = 3
-    for attempt in range(max_retries):
+    # Retry logic for 503/429 errors
+    for attempt in range(MAX_RETRIES):
         try:
             response = client.models.generate_content(
                 model="gemini-2.5-flash",
@@ -129,11 +151,11 @@ def ai_chat_friend(user_input, memory_data):
             )
             return response.text
         except Exception as e:
-            if "503" in str(e) or "overloaded" in str(e).lower():
-                if attempt < max_retries - 1:
-                    print(f"⚠️ Model overloaded (503). Retrying in 2s... ({attempt+1}/{max_retries})")
-                    time.sleep(2)
-                    continue
+            if is_retryable(e) and attempt < MAX_RETRIES - 1:
+                delay = backoff_delay(attempt)
+                print(f"⚠️ Model overloaded ({e.code}). Retrying in {delay:.1f}s... ({attempt+1}/{MAX_RETRIES})")
+                time.sleep(delay)
+                continue
             return f"Бро, что-то меня глючит... ({e})"
 
 def main():
@@ -141,6 +163,7 @@ def main():
     print("   🤖 AI Bro with Memory (Gemini 2.0)")
     print("="*50)
     
+    prewarm_client()
     memory = load_memory()
     print(f"📂 Память загружена. Фактов обо мне: {len(memory['user_facts'])}")
     print("🔹 Пиши 'exit', чтобы выйти.\n")
@@ -1,16 +1,21 @@
 import os
 import sys
+import atexit
 import json
+import hashlib
+import importlib
 import time
+import threading
 import datetime
+import shutil
+import tempfile
 import subprocess
-import cv2
-import speech_recognition as sr
+import httpx
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
-from gtts import gTTS
-from PIL import Image
+# Heavy deps (cv2, PIL, speech_recognition, gtts) are imported lazily:
+# the banner shows instantly and cv2 loads in the background (see main()).
 
 try:
     from gpiozero import Button
@@ -18,6 +23,20 @@ try:
 except (ImportError, OSError):
     GPIO_AVAILABLE = False
 
+try:
+    # Fallback player for the answer MP3 when mpg123 is missing
+    import miniaudio
+    import alsaaudio
+    INPROC_AUDIO_AVAILABLE = True
+except ImportError:
+    INPROC_AUDIO_AVAILABLE = False
+
+try:
+    import orjson  # The shared memory.json is rewritten on every new fact
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Get absolute path of the script directory
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -29,112 +48,372 @@ if not API_KEY:
     print("❌ Error: GEMINI_API_KEY not found in .env")
     sys.exit(1)
 
-# Initialize Gemini Client
-client = genai.Client(api_key=API_KEY)
+# 15 s timeout covers the photo upload; past that the user gets an error instead of a hang
+GEMINI_TIMEOUT_MS = 15_000
+# One upload per photo: keep that single connection open between photos (no new TLS handshake)
+client = genai.Client(api_key=API_KEY, http_options=types.HttpOptions(
+    timeout=GEMINI_TIMEOUT_MS,
+    client_args={"limits": httpx.Limits(max_keepalive_connections=1, keepalive_expiry=120)}))
+
+def prewarm_client():
+    """DNS + TLS to Gemini, run while the camera opens so the first photo upload starts on a hot connection."""
+    try:
+        client.models.get(model="gemini-2.5-flash")
+    except Exception:
+        pass
 
 # Shared Memory Path (Absolute)
 MEMORY_FILE = os.path.join(SCRIPT_DIR, "../Ai_assistant-memory-voice/memory.json")
 ALSA_DEVICE = "bluealsa" # For Pi Lite Bluetooth
 TTS_SPEED = 1.25
 BUTTON_PIN = 22          # GPIO 22 (Pin 15)
-TEMP_WAV = os.path.join(SCRIPT_DIR, "input.wav")
+MAX_IMAGE_SIDE = 1024    # Longest side sent to Gemini (px)
+CAPTURE_SIZE = (1280, 720)  # No point capturing 4K just to downscale it
+JPEG_QUALITY = 85
+VISION_CACHE_DIR = os.path.join(SCRIPT_DIR, ".vision_cache")
+VISION_CACHE_MAX_DISTANCE = 6  # dHash bits; below this two frames are "the same scene"
+VISION_CACHE_MAX_FILES = 200
+_vision_index = None  # text_key -> {dhash: path}, built once from file names
+SAMPLE_RATE = 16000  # arecord S16_LE mono, fed to STT as raw PCM (no WAV file)
+
+# Offline TTS (Piper): voice models (.onnx + .onnx.json) from https://github.com/rhasspy/piper
+PIPER_MODELS = {
+    "ru": os.getenv("PIPER_MODEL_RU", os.path.join(SCRIPT_DIR, "voices/ru_RU-irina-medium.onnx")),
+    "en": os.getenv("PIPER_MODEL_EN", os.path.join(SCRIPT_DIR, "voices/en_US-lessac-low.onnx")),
+}
+_piper_voices = {}
+USE_FFMPEG = os.getenv("USE_FFMPEG", "0") == "1"  # Debug: old MP3 -> WAV -> aplay path
+# Scratch WAV for that path: one file on tmpfs, overwritten per call, removed at exit
+TMP_WAV = os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "pt_vision_tts.wav")
+atexit.register(lambda: os.path.exists(TMP_WAV) and os.remove(TMP_WAV))
+# Low-latency startup: skip ffmpeg input probing, small aplay ring buffer
+FFMPEG_LOW_LATENCY = ["-fflags", "nobuffer", "-flags", "low_delay", "-probesize", "32", "-analyzeduration", "0"]
+APLAY_LOW_LATENCY = ["--period-time=40000", "--buffer-time=120000"]
+MPG123_AVAILABLE = shutil.which("mpg123") is not None
+ALSA_PERIOD_FRAMES = 1024  # Small period for the in-process ALSA fallback
+PIPE_BUFSIZE = 65536  # 64 KB pipe buffers: fewer read/write syscalls for audio streams
+
+# gTTS cache: repeated phrases skip the network round-trip
+TTS_CACHE_DIR = os.path.join(SCRIPT_DIR, ".tts_cache")
+TTS_CACHE_MAX_FILES = 100
 
 # --- MEMORY FUNCTIONS ---
+def _index_memory(data):
+    """Builds the runtime caches: fact-text set (O(1) dedup) and the joined prompt block."""
+    data["_text_index"] = {f["text"] for f in data["user_facts"]}
+    data["_facts_joined"] = "\n".join(f"- [{f['created_at']}] {f['text']}" for f in data["user_facts"])
+    return data
+
 def load_memory():
     if not os.path.exists(MEMORY_FILE):
-        return {"user_facts": []}
+        return _index_memory({"user_facts": []})
     try:
+        if ORJSON_AVAILABLE:
+            with open(MEMORY_FILE, 'rb') as f:
+                return _index_memory(orjson.loads(f.read()))
         with open(MEMORY_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return {"user_facts": []}
+            return _index_memory(json.load(f))
+    except json.JSONDecodeError:  # orjson.JSONDecodeError subclasses it
+        return _index_memory({"user_facts": []})
 
 def save_memory(memory_data):
-    with open(MEMORY_FILE, 'w', encoding='utf-8') as f:
-        json.dump(memory_data, f, ensure_ascii=False, indent=2)
+    # _text_index / _facts_joined are rebuilt on load, so they stay out of the file
+    data = {k: v for k, v in memory_data.items() if not k.startswith("_")}
+    if ORJSON_AVAILABLE:
+        with open(MEMORY_FILE, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(MEMORY_FILE, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    invalidate_prompt_cache()
+
+# --- PROMPT CACHE ---
+# The vision prompt only crosses Gemini's ~1024-token cache minimum once the
+# fact list grows; until then it simply goes inline.
+PROMPT_CACHE_MIN_CHARS = 4096
+PROMPT_CACHE_TTL_S = 3600
+_prompt_cache = (None, None, 0)  # (sys_prompt, cache name or None, expires_at)
+_prompt_cache_pending = threading.Event()
+
+def _create_prompt_cache(sys_prompt):
+    global _prompt_cache
+    try:
+        name = client.caches.create(
+            model="gemini-2.5-flash",
+            config=types.CreateCachedContentConfig(system_instruction=sys_prompt, ttl=f"{PROMPT_CACHE_TTL_S}s")
+        ).name
+    except Exception:
+        name = None  # Remembered until expiry, so a failing create isn't retried per photo
+    _prompt_cache = (sys_prompt, name, time.time() + PROMPT_CACHE_TTL_S - 60)
+    _prompt_cache_pending.clear()
+
+def prompt_config(sys_prompt, **kwargs):
+    """Config for the vision call: cached prompt when ready, else inline while a cache is built in the background."""
+    cached_prompt, name, expires_at = _prompt_cache
+    fresh = cached_prompt == sys_prompt and time.time() < expires_at
+    if fresh and name:
+        return types.GenerateContentConfig(cached_content=name, **kwargs)
+    if not fresh and len(sys_prompt) >= PROMPT_CACHE_MIN_CHARS and not _prompt_cache_pending.is_set():
+        _prompt_cache_pending.set()
+        threading.Thread(target=_create_prompt_cache, args=(sys_prompt,), daemon=True).start()
+    return types.GenerateContentConfig(system_instruction=sys_prompt, **kwargs)
+
+def invalidate_prompt_cache():
+    """A new fact changes the prompt: forget the cache and delete it in the background."""
+    global _prompt_cache
+    name = _prompt_cache[1]
+    _prompt_cache = (None, None, 0)
+    if name:
+        def _delete():
+            try:
+                client.caches.delete(name=name)
+            except Exception:
+                pass
+        threading.Thread(target=_delete, daemon=True).start()
 
 # --- AUDIO FUNCTIONS ---
+def get_piper_voice(lang):
+    """Loads the Piper voice for `lang` once. None if piper or the model is missing or broken."""
+    if lang not in _piper_voices:
+        voice = None
+        model_path = PIPER_MODELS.get(lang)
+        if model_path and os.path.exists(model_path):
+            try:
+                from piper import PiperVoice
+                voice = PiperVoice.load(model_path)
+            except ImportError:
+                pass
+            except Exception as e:
+                # Missing .onnx.json or a broken model: report once, then stay on gTTS
+                print(f"⚠️ Piper voice {model_path} failed to load: {e}")
+        _piper_voices[lang] = voice
+    return _piper_voices[lang]
+
+def speak_piper(text, voice):
+    """Streams Piper PCM straight into aplay: no network, no mp3/wav files."""
+    from piper import SynthesisConfig
+
+    cmd = ['aplay', '-q', '-D', ALSA_DEVICE, '-t', 'raw', '-f', 'S16_LE', '-c', '1',
+           '-r', str(voice.config.sample_rate)]
+    player = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=PIPE_BUFSIZE)
+    try:
+        for chunk in voice.synthesize(text, syn_config=SynthesisConfig(length_scale=1 / TTS_SPEED)):
+            player.stdin.write(chunk.audio_int16_bytes)
+    finally:
+        player.stdin.close()
+        player.wait()
+
+def get_tts_mp3(text, lang):
+    """Returns a cached gTTS MP3 for (lang, text), synthesizing it on a miss."""
+    from gtts import gTTS
+
+    key = hashlib.sha1((lang + "|" + text).encode("utf-8")).hexdigest()
+    path = os.path.join(TTS_CACHE_DIR, f"{key}.mp3")
+    if os.path.exists(path):
+        os.utime(path)  # Mark as recently used
+        return path
+
+    os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+    gTTS(text=text, lang=lang).save(path + ".part")
+    os.replace(path + ".part", path)  # Never leave a half-written MP3 in the cache
+
+    # LRU eviction: drop the least recently used files above the limit
+    cached = sorted(os.scandir(TTS_CACHE_DIR), key=lambda e: e.stat().st_mtime)
+    for entry in cached[:-TTS_CACHE_MAX_FILES]:
+        os.remove(entry.path)
+    return path
+
+def play_via_ffmpeg(mp3_filename):
+    """Debug path (USE_FFMPEG=1): MP3 -> WAV with ffmpeg, then aplay via BlueALSA."""
+    subprocess.run(
+        ["ffmpeg", "-y", *FFMPEG_LOW_LATENCY, "-i", mp3_filename, TMP_WAV],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True
+    )
+    
+    # Try explicit bluealsa device first, then default
+    try:
+        subprocess.run(['aplay', '-D', ALSA_DEVICE, *APLAY_LOW_LATENCY, TMP_WAV], 
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    except:
+        # Fallback to default device
+        subprocess.run(['aplay', *APLAY_LOW_LATENCY, TMP_WAV], 
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+
+def play_mp3_in_process(mp3_filename):
+    """Decodes MP3 with miniaudio and writes S16 PCM straight to ALSA (no subprocesses)."""
+    decoded = miniaudio.decode_file(mp3_filename, output_format=miniaudio.SampleFormat.SIGNED16, nchannels=1)
+    pcm = alsaaudio.PCM(alsaaudio.PCM_PLAYBACK, device=ALSA_DEVICE, channels=1, rate=decoded.sample_rate,
+                        format=alsaaudio.PCM_FORMAT_S16_LE, periodsize=ALSA_PERIOD_FRAMES)
+    try:
+        data = decoded.samples.tobytes()
+        step = ALSA_PERIOD_FRAMES * 2  # 16-bit mono
+        for i in range(0, len(data), step):
+            pcm.write(data[i:i + step])
+    finally:
+        pcm.close()
+
 def speak(text, lang='ru'):
-    """TTS with cross-platform support and SPEED CONTROL."""
-    mp3_filename = os.path.join(SCRIPT_DIR, "output_tts.mp3")
-    wav_filename = os.path.join(SCRIPT_DIR, "output_tts.wav")
+    """TTS: offline Piper on the Pi when a voice model is present, else gTTS."""
+    if sys.platform != "darwin":
+        try:
+            voice = get_piper_voice(lang)
+            if voice:
+                speak_piper(text, voice)
+                return
+        except Exception as e:
+            print(f"⚠️ Piper error: {e}. Falling back to gTTS.")
 
     try:
-        tts = gTTS(text=text, lang=lang)
-        tts.save(mp3_filename)
+        mp3_filename = get_tts_mp3(text, lang)
         
         if sys.platform == "darwin": # macOS
             subprocess.run(['afplay', '--rate', str(TTS_SPEED), mp3_filename], check=True)
+        elif USE_FFMPEG:
+            play_via_ffmpeg(mp3_filename)
+        elif not MPG123_AVAILABLE and INPROC_AUDIO_AVAILABLE:
+            play_mp3_in_process(mp3_filename)
         else: # Linux (Raspberry Pi)
-            # 1. Try converting to WAV using ffmpeg (Most robust for Pi)
+            # mpg123 decodes + plays via BlueALSA in one process, no temp WAV
             try:
                 subprocess.run(
-                    ["ffmpeg", "-y", "-i", mp3_filename, wav_filename],
+                    ['mpg123', '-q', '-o', 'alsa', '-a', ALSA_DEVICE, mp3_filename],
                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True
                 )
-                
-                # 2. Play using aplay via BlueALSA
-                # Try explicit bluealsa device first, then default
-                try:
-                    subprocess.run(['aplay', '-D', 'bluealsa', wav_filename], 
-                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-                except:
-                    # Fallback to default device
-                    subprocess.run(['aplay', wav_filename], 
-                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-                                 
-            except Exception as e:
-                print(f"⚠️ ffmpeg/aplay error: {e}")
-                # Fallback to mpg123 if ffmpeg fails
-                subprocess.run(
-                    ['mpg123', '-a', 'bluealsa', mp3_filename], 
-                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
-                )
+            except subprocess.CalledProcessError:
+                # BT sink missing or disconnected: retry on the default device
+                subprocess.run(['mpg123', '-q', mp3_filename], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
 
     except Exception as e:
         print(f"❌ TTS Error: {e}")
-    finally:
-        if os.path.exists(mp3_filename): os.remove(mp3_filename)
-        if os.path.exists(wav_filename): os.remove(wav_filename)
 
 # --- CAMERA FUNCTIONS ---
+_camera = None
+
+def _release_camera():
+    """atexit: releases whichever capture is open at exit (registered once)."""
+    if _camera is not None:
+        _camera.release()
+
+atexit.register(_release_camera)
+
+def get_camera(camera_index=0):
+    """Opens the webcam once and keeps it open (V4L2 open + warmup is slow on Pi)."""
+    global _camera
+    import cv2
+
+    if _camera is None or not _camera.isOpened():
+        print(f"📸 Opening camera [{camera_index}]...")
+        backend = cv2.CAP_V4L2 if sys.platform.startswith("linux") else cv2.CAP_ANY
+        _camera = cv2.VideoCapture(camera_index, backend)
+        _camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Keep at most one stale frame
+        _camera.set(cv2.CAP_PROP_FRAME_WIDTH, CAPTURE_SIZE[0])
+        _camera.set(cv2.CAP_PROP_FRAME_HEIGHT, CAPTURE_SIZE[1])
+        # Warmup (auto-exposure), paid once instead of per photo
+        time.sleep(0.5)
+    return _camera
+
 def take_photo(filename="capture.jpg", camera_index=0):
     """Captures a single frame from the webcam."""
-    print(f"📸 Opening camera [{camera_index}]...")
-    cap = cv2.VideoCapture(camera_index)
+    global _camera
+    import cv2
+
+    cap = get_camera(camera_index)
     if not cap.isOpened():
         print(f"❌ Error: Could not open camera {camera_index}.")
         return False
     
-    # Warmup
-    time.sleep(0.5)
-    
-    ret, frame = cap.read()
-    cap.release()
+    # Drain stale buffered frames so the photo is "now"
+    for _ in range(2):
+        cap.grab()
+    ret, frame = cap.retrieve()
     
     if ret:
-        cv2.imwrite(filename, frame)
+        cv2.imwrite(filename, frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
         print(f"✅ Photo saved: {filename}")
         return True
     else:
         print("❌ Error: Could not read frame.")
+        cap.release()
+        _camera = None  # Reopen on next photo
         return False
 
+# --- VISION CACHE ---
+def image_dhash(image):
+    """64-bit difference hash: near-duplicate frames differ only in a few bits."""
+    from PIL import Image
+
+    small = image.convert("L").resize((9, 8), Image.LANCZOS)
+    px = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = px[row * 9 + col]
+            bits = (bits << 1) | (left > px[row * 9 + col + 1])
+    return bits
+
+def _get_vision_index():
+    """Loads the cache index from file names once (no JSON parsing)."""
+    global _vision_index
+    if _vision_index is None:
+        _vision_index = {}
+        if os.path.isdir(VISION_CACHE_DIR):
+            for name in os.listdir(VISION_CACHE_DIR):
+                text_key, _, rest = name.partition("_")
+                try:
+                    dhash = int(rest[:-len(".json")], 16)
+                except ValueError:
+                    continue
+                _vision_index.setdefault(text_key, {})[dhash] = os.path.join(VISION_CACHE_DIR, name)
+    return _vision_index
+
+def vision_cache_lookup(text_key, dhash):
+    """Returns a cached answer for the same question about a near-identical photo."""
+    for cached_hash, path in _get_vision_index().get(text_key, {}).items():
+        if bin(cached_hash ^ dhash).count("1") < VISION_CACHE_MAX_DISTANCE:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    resp = json.load(f).get("response")
+                os.utime(path)  # Mark as recently used
+                return resp
+            except (OSError, ValueError):
+                return None
+    return None
+
+def vision_cache_store(text_key, dhash, ai_resp):
+    """Saves the answer under <key sha1>_<image dhash>.json, dropping the oldest above the limit."""
+    os.makedirs(VISION_CACHE_DIR, exist_ok=True)
+    path = os.path.join(VISION_CACHE_DIR, f"{text_key}_{dhash:016x}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"response": ai_resp}, f, ensure_ascii=False)
+    index = _get_vision_index()
+    index.setdefault(text_key, {})[dhash] = path
+
+    # LRU eviction, same as the TTS cache
+    cached = sorted(os.scandir(VISION_CACHE_DIR), key=lambda e: e.stat().st_mtime)
+    for entry in cached[:-VISION_CACHE_MAX_FILES]:
+        os.remove(entry.path)
+        old_key, _, rest = entry.name.partition("_")
+        try:
+            index.get(old_key, {}).pop(int(rest[:-len(".json")], 16), None)
+        except ValueError:
+            pass
+
 # --- AI LOGIC ---
-def analyze_image_and_voice(image_path, user_voice_text, current_memory):
+def analyze_image_and_voice(image_path, user_voice_text, current_memory, today_iso):
     """Gemini 2.5 Flash Multimodal Analysis."""
+    from PIL import Image
     
     # Prepare Memory Context
-    facts_list = "\n".join([f"- [{f['created_at']}] {f['text']}" for f in current_memory["user_facts"]])
-    current_date = datetime.date.today().strftime("%Y-%m-%d")
+    facts_list = current_memory["_facts_joined"]
 
+    # Per-turn parts (date, question) go into contents so the
+    # system prompt stays identical between turns and can be cached.
     sys_prompt = f"""
     Ты - ИИ-Кент с глазами. 
-    СЕГОДНЯ: {current_date}
     
     ТВОЯ ЗАДАЧА:
     1. Посмотреть на фото.
-    2. Послушать вопрос пользователя: "{user_voice_text}"
+    2. Послушать вопрос пользователя (в сообщении, там же сегодняшняя дата).
     3. Ответить максимально лаконично и по делу. Только суть.
     4. ИЗВЛЕЧЬ ФАКТЫ из увиденного, если это важно.
     
@@ -149,16 +428,22 @@ def analyze_image_and_voice(image_path, user_voice_text, current_memory):
     """
 
     try:
-        # Load Image
+        # Load Image (downscaled: smaller upload, same answer quality)
         image = Image.open(image_path)
+        image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.LANCZOS)
+
+        # Same question about the same scene (with the same date and facts) -> answer instantly, no upload
+        text_key = hashlib.sha1(f"{today_iso}\0{facts_list}\0{user_voice_text}".encode("utf-8")).hexdigest()
+        dhash = image_dhash(image)
+        cached_resp = vision_cache_lookup(text_key, dhash)
+        if cached_resp:
+            print("⚡ [Cache]: Та же сцена, тот же вопрос")
+            return cached_resp
         
         response = client.models.generate_content(
             model="gemini-2.5-flash",
-            config=types.GenerateContentConfig(
-                system_instruction=sys_prompt,
-                response_mime_type="application/json"
-            ),
-            contents=[user_voice_text, image]
+            config=prompt_config(sys_prompt, response_mime_type="application/json"),
+            contents=[f"СЕГОДНЯ: {today_iso}\nВОПРОС: {user_voice_text}", image]
         )
         
         if response.text:
@@ -168,13 +453,14 @@ def analyze_image_and_voice(image_path, user_voice_text, current_memory):
             
             # Save Fact if present
             if new_fact:
-                existing_texts = [f["text"] for f in current_memory["user_facts"]]
-                if new_fact not in existing_texts:
-                    today = datetime.date.today().isoformat()
+                if new_fact not in current_memory["_text_index"]:
+                    current_memory["_text_index"].add(new_fact)
                     print(f"🧠 [Memory]: Запомнил -> {new_fact}")
-                    current_memory["user_facts"].append({"text": new_fact, "created_at": today})
+                    current_memory["user_facts"].append({"text": new_fact, "created_at": today_iso})
+                    current_memory["_facts_joined"] += ("\n" if current_memory["_facts_joined"] else "") + f"- [{today_iso}] {new_fact}"
                     save_memory(current_memory)
             
+            vision_cache_store(text_key, dhash, ai_resp)
             return ai_resp
             
     except Exception as e:
@@ -182,10 +468,17 @@ def analyze_image_and_voice(image_path, user_voice_text, current_memory):
         return "Бро, я ослеп... Что-то с сервером."
 
 # --- MAIN LOOP ---
+def preload_heavy_modules():
+    """Imports cv2 and PIL in the background while mic/button setup runs."""
+    importlib.import_module("cv2")
+    importlib.import_module("PIL.Image")
+
 def main():
     print("\n" + "="*50)
     print("   👁️  Vision AI Bro (Gemini 2.5 + Memory)")
     print("="*50)
+    threading.Thread(target=preload_heavy_modules, daemon=True).start()
+    import speech_recognition as sr
 
     # Create photos directory (Absolute)
     PHOTOS_DIR = os.path.join(SCRIPT_DIR, "photos")
@@ -206,47 +499,46 @@ def main():
         # Default to 0, but user can change this default here if needed
         camera_index = 2 
         print(f"📷 Using Default Camera ({camera_index})")
+    threading.Thread(target=prewarm_client, daemon=True).start()
+    get_camera(camera_index)  # Open once at startup
 
     memory = load_memory()
+    # One Recognizer per run, static thresholds (no adaptive energy loop)
     r = sr.Recognizer()
+    r.dynamic_energy_threshold = False
+    r.energy_threshold = 300
+    r.pause_threshold = 0.6
     
     # Get Mic Device for arecord (e.g., "hw:1,0")
     mic_device = os.getenv("MIC_DEVICE", "hw:1,0")
 
     speak("Я готов. Нажми кнопку, чтобы сделать фото.", 'ru')
 
+    # Edge-triggered waits (gpiozero sleeps on the GPIO fd), no sleep-polling
+    button = None
     if GPIO_AVAILABLE:
         try:
             button = Button(BUTTON_PIN)
             print(f"✅ Button 3 initialized on GPIO {BUTTON_PIN} (Pin 15)")
-            USE_POLLING = False
+            print("👉 CLICK to photo, HOLD to record voice.")
         except Exception as e:
-            print(f"⚠️ Button error: {e}. Switching to POLLING mode.")
-            button = None
-            USE_POLLING = True
-        print("👉 CLICK to photo, HOLD to record voice.")
-    else:
+            print(f"⚠️ Button error: {e}. Switching to keyboard mode.")
+    if not button:
         print("⚠️ GPIO not available. Use ENTER to photo, then ENTER to record.")
-        USE_POLLING = False
 
     while True:
         try:
-            # Generate timestamped filename
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            photo_filename = os.path.join(PHOTOS_DIR, f"photo_{timestamp}.jpg")
-
-            if GPIO_AVAILABLE:
-                if not USE_POLLING:
-                    button.wait_for_press()
-                else:
-                    import RPi.GPIO as GPIO
-                    GPIO.setmode(GPIO.BCM)
-                    GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-                    while GPIO.input(BUTTON_PIN) == GPIO.HIGH:
-                        time.sleep(0.05)
+            if button:
+                button.wait_for_press()
             else:
                 input("\n📸 Press ENTER to snap photo...")
 
+            # Timestamped filename + today's date from one clock read, taken after the press
+            now = datetime.datetime.now()
+            timestamp = now.strftime("%Y-%m-%d_%H-%M-%S")
+            today_iso = now.date().isoformat()
+            photo_filename = os.path.join(PHOTOS_DIR, f"photo_{timestamp}.jpg")
+
             # STEP 1: SNAP PHOTO
             if not take_photo(photo_filename, camera_index):
                 speak("Не могу сделать фото, проверь камеру.", 'ru')
@@ -262,13 +554,9 @@ def main():
             is_holding = False
             start_time = time.time()
             
-            if GPIO_AVAILABLE:
-                # Wait a bit to see if it's a hold
-                time.sleep(0.3) 
-                if not USE_POLLING:
-                    if button.is_pressed: is_holding = True
-                else:
-                    if GPIO.input(BUTTON_PIN) == GPIO.LOW: is_holding = True
+            if button:
+                # Still pressed after 0.3 s (no release edge) -> it's a hold
+                is_holding = not button.wait_for_release(timeout=0.3)
             else:
                 # On PC, we just ask
                 ans = input("🎤 Hold to record? (y/n): ").lower()
@@ -279,21 +567,23 @@ def main():
             if is_holding:
                 # --- START RECORDING ---
                 print("🎤 Listening...")
-                cmd = ["arecord", "-D", mic_device, "-f", "S16_LE", "-r", "16000", "-c", "1", TEMP_WAV]
+                cmd = ["arecord", "-q", "-D", mic_device, "-f", "S16_LE", "-r", str(SAMPLE_RATE), "-c", "1", "-t", "raw"]
+                chunks = []
                 
                 if sys.platform == "darwin":
                     print("☁️ (Simulating recording on macOS...)")
                     time.sleep(2)
                     process = None
                 else:
-                    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
-                if GPIO_AVAILABLE:
-                    if not USE_POLLING:
-                        button.wait_for_release()
-                    else:
-                        while GPIO.input(BUTTON_PIN) == GPIO.LOW:
-                            time.sleep(0.05)
+                    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=PIPE_BUFSIZE)
+                    reader = threading.Thread(
+                        target=lambda: chunks.extend(iter(lambda: process.stdout.read(PIPE_BUFSIZE), b"")),
+                        daemon=True
+                    )
+                    reader.start()
+
+                if button:
+                    button.wait_for_release()
                 else:
                     input("🎤 ЗАПИСЬ... [ENTER] Остановить")
 
@@ -301,22 +591,22 @@ def main():
                 if process:
                     process.terminate()
                     process.wait()
+                    reader.join()
                 
                 # --- STT ---
                 try:
-                    if os.path.exists(TEMP_WAV):
-                        with sr.AudioFile(TEMP_WAV) as source:
-                            audio = r.record(source)
+                    raw = b"".join(chunks)
+                    if raw:
+                        # Known format, so build AudioData directly (no RIFF parsing)
+                        audio = sr.AudioData(raw, SAMPLE_RATE, 2)
                         user_text = r.recognize_google(audio, language="ru-RU")
                         print(f"🗣️  You: {user_text}")
                 except Exception as e:
                     print(f"⚠️ STT Error: {e}")
-                finally:
-                    if os.path.exists(TEMP_WAV): os.remove(TEMP_WAV)
 
             # 4. Analyze
             print("🤔 Thinking...")
-            response_text = analyze_image_and_voice(photo_filename, user_text, memory)
+            response_text = analyze_image_and_voice(photo_filename, user_text, memory, today_iso)
             
             # 5. Respond
             print(f"🤖 AI: {response_text}")
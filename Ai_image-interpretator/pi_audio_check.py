@@ -1,4 +1,5 @@
 import os
+import re
 import subprocess
 import speech_recognition as sr
 from gtts import gTTS
@@ -9,22 +10,30 @@ def print_header(text):
     print(f"   {text}")
     print("="*40)
 
+USB_MIC_RE = re.compile(r"USB|PnP")
+_mic_names = None  # PortAudio enumeration is slow on Pi: do it once per run
+
+def list_mics():
+    global _mic_names
+    if _mic_names is None:
+        _mic_names = sr.Microphone.list_microphone_names()
+    return _mic_names
+
 def check_microphone():
     print_header("🎤 MICROPHONE CHECK")
-    mics = sr.Microphone.list_microphone_names()
+    mics = list_mics()
     
     if not mics:
         print("❌ No microphones found!")
         return None
 
     print("Available Microphones:")
-    usb_mic_index = None
-    
     for i, name in enumerate(mics):
         print(f"[{i}] {name}")
-        if "USB" in name or "PnP" in name:
-            usb_mic_index = i
-            
+
+    # First USB/PnP device wins
+    usb_mic_index = next((i for i, name in enumerate(mics) if USB_MIC_RE.search(name)), None)
+
     if usb_mic_index is not None:
         print(f"\n✅ Found likely USB Mic at Index: {usb_mic_index}")
         return usb_mic_index
@@ -44,7 +53,9 @@ def check_speaker():
     # Convert to WAV for aplay (using ffmpeg as it's robust)
     try:
         subprocess.run(
-            ["ffmpeg", "-y", "-i", "test_audio.mp3", "test_audio.wav"],
+            ["ffmpeg", "-y", "-fflags", "nobuffer", "-flags", "low_delay",
+             "-probesize", "32", "-analyzeduration", "0",
+             "-i", "test_audio.mp3", "test_audio.wav"],
             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True
         )
     except FileNotFoundError:
@@ -53,7 +64,7 @@ def check_speaker():
 
     # Play
     try:
-        subprocess.run(["aplay", "-D", "bluealsa", "test_audio.wav"], check=True)
+        subprocess.run(["aplay", "-D", "bluealsa", "--period-time=40000", "--buffer-time=120000", "test_audio.wav"], check=True)
         print("✅ Audio command executed successfully.")
     except subprocess.CalledProcessError as e:
         print(f"❌ Audio playback failed: {e}")
@@ -1,16 +1,24 @@
 import os
 import sys
+import atexit
 import time
+import threading
+import queue
 import json
+import asyncio
+import hashlib
 import datetime
+import shutil
+import tempfile
 import subprocess
+from functools import lru_cache
 import cv2
+import httpx
 import speech_recognition as sr
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 from gtts import gTTS
-from PIL import Image
 from deep_translator import GoogleTranslator
 
 try:
@@ -19,6 +27,32 @@ try:
 except (ImportError, OSError):
     GPIO_AVAILABLE = False
 
+try:
+    # In-process MP3 playback, used when mpg123 isn't installed
+    import miniaudio
+    import alsaaudio
+    INPROC_AUDIO_AVAILABLE = True
+except ImportError:
+    INPROC_AUDIO_AVAILABLE = False
+
+try:
+    import h2  # noqa: F401 -- lets httpx speak HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    import orjson  # ~5-10x faster than stdlib json for memory.json
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import webrtcvad
+    VAD_AVAILABLE = True
+except ImportError:
+    VAD_AVAILABLE = False
+
 # --- CONFIGURATION ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 load_dotenv(os.path.join(SCRIPT_DIR, ".env")) # Root .env
@@ -28,12 +62,18 @@ if not API_KEY:
     print("❌ Error: GEMINI_API_KEY not found in .env")
     sys.exit(1)
 
-client = genai.Client(api_key=API_KEY)
+# One Gemini client for all three modes (explicit timeout: fail fast instead of hanging)
+GEMINI_TIMEOUT_MS = 15_000
+# Keep-alive pool: TLS handshakes are paid once per process, and with HTTP/2
+# concurrent requests share one connection
+_HTTP_ARGS = {"http2": HTTP2_AVAILABLE,
+              "limits": httpx.Limits(max_keepalive_connections=8, keepalive_expiry=120)}
+client = genai.Client(api_key=API_KEY, http_options=types.HttpOptions(
+    timeout=GEMINI_TIMEOUT_MS, client_args=_HTTP_ARGS, async_client_args=_HTTP_ARGS))
 
 # Paths
 MEMORY_FILE = os.path.join(SCRIPT_DIR, "Ai_assistant-memory-voice/memory.json")
 PHOTOS_DIR = os.path.join(SCRIPT_DIR, "Ai_image-interpretator/photos")
-TEMP_WAV = os.path.join(SCRIPT_DIR, "temp_input.wav")
 
 # Pins
 BTN_ASSISTANT_PIN = 17 # Button 1 (Pin 11)
@@ -44,6 +84,35 @@ BTN_VISION_PIN = 22     # Button 3 (Pin 15)
 ALSA_DEVICE = "bluealsa"
 TTS_SPEED = 1.25
 MIC_DEVICE = os.getenv("MIC_DEVICE", "hw:1,0")
+SAMPLE_RATE = 16000
+VAD_FRAME_MS = 20        # webrtcvad accepts 10/20/30 ms frames
+VAD_SILENCE_MS = 800     # Trailing silence that ends the phrase
+CAMERA_INDEX = int(os.getenv("CAMERA_INDEX", 0))
+CAPTURE_SIZE = (1280, 720)  # No point capturing 4K just to downscale it
+MAX_IMAGE_SIDE = 1024       # Longest side sent to Gemini (px)
+JPEG_QUALITY = 85
+SAVE_PHOTOS = os.getenv("SAVE_PHOTOS", "0") == "1"  # Debug: keep a copy of each photo on disk
+
+# Offline TTS (Piper): voice models (.onnx + .onnx.json) from https://github.com/rhasspy/piper
+PIPER_MODELS = {
+    "ru": os.getenv("PIPER_MODEL_RU", os.path.join(SCRIPT_DIR, "voices/ru_RU-irina-medium.onnx")),
+    "en": os.getenv("PIPER_MODEL_EN", os.path.join(SCRIPT_DIR, "voices/en_US-lessac-low.onnx")),
+}
+_piper_voices = {}
+USE_FFMPEG = os.getenv("USE_FFMPEG", "0") == "1"  # Debug: old MP3 -> WAV -> aplay path
+# Scratch WAV for that path: one file on tmpfs, overwritten per call, removed at exit
+TMP_WAV = os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "pt_main_tts.wav")
+atexit.register(lambda: os.path.exists(TMP_WAV) and os.remove(TMP_WAV))
+# Low-latency startup: skip ffmpeg input probing, small aplay ring buffer
+FFMPEG_LOW_LATENCY = ["-fflags", "nobuffer", "-flags", "low_delay", "-probesize", "32", "-analyzeduration", "0"]
+APLAY_LOW_LATENCY = ["--period-time=40000", "--buffer-time=120000"]
+MPG123_AVAILABLE = shutil.which("mpg123") is not None
+ALSA_PERIOD_FRAMES = 1024  # Small period for the in-process ALSA fallback
+PIPE_BUFSIZE = 65536  # 64 KB pipe buffers: fewer read/write syscalls for audio streams
+
+# gTTS cache: repeated phrases skip the network round-trip
+TTS_CACHE_DIR = os.path.join(SCRIPT_DIR, ".tts_cache")
+TTS_CACHE_MAX_FILES = 100
 
 # Translator State
 trans_modes = [
@@ -51,131 +120,378 @@ trans_modes = [
     {"in": "en-US", "out": "ru", "label": "🇺🇸 EN -> 🇷🇺 RU"}
 ]
 current_trans_idx = 0
+# One long-lived translator per target language, built once at startup
+_TRANSLATORS = {m["out"]: GoogleTranslator(source='auto', target=m["out"]) for m in trans_modes}
+
+@lru_cache(maxsize=512)
+def _translate(text, target):
+    """Memoized translation: repeated phrases skip the HTTP call."""
+    return _TRANSLATORS[target].translate(text)
 
 # --- HELPERS ---
+def _index_memory(data):
+    """Builds the runtime caches: fact-text set (O(1) dedup) and the joined prompt block."""
+    data["_text_index"] = {f["text"] for f in data["user_facts"]}
+    data["_facts_joined"] = "\n".join(f"- {f['text']}" for f in data["user_facts"])
+    return data
+
 def load_memory():
-    if not os.path.exists(MEMORY_FILE): return {"user_facts": []}
+    if not os.path.exists(MEMORY_FILE): return _index_memory({"user_facts": []})
+    try:
+        if ORJSON_AVAILABLE:
+            with open(MEMORY_FILE, 'rb') as f: return _index_memory(orjson.loads(f.read()))
+        with open(MEMORY_FILE, 'r', encoding='utf-8') as f: return _index_memory(json.load(f))
+    except: return _index_memory({"user_facts": []})
+
+def save_memory(memory):
+    # Keys starting with "_" are runtime caches, never persisted
+    data = {k: v for k, v in memory.items() if not k.startswith("_")}
+    if ORJSON_AVAILABLE:
+        with open(MEMORY_FILE, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(MEMORY_FILE, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    invalidate_prompt_caches()
+
+# --- PROMPT CACHE (Gemini context caching) ---
+PROMPT_CACHE_TTL_S = 3600
+# Explicit caches need >= 1024 tokens on gemini-2.5-flash (~4 chars/token); shorter
+# prompts are sent inline without ever calling caches.create
+PROMPT_CACHE_MIN_CHARS = 4096
+_prompt_caches = {}  # sys_prompt -> (cache name, expires_at)
+_prompt_caches_pending = set()
+_prompt_caches_lock = threading.Lock()
+
+def _create_prompt_cache(sys_prompt):
+    """Background: creates the context cache for `sys_prompt` (later turns pick it up)."""
     try:
-        with open(MEMORY_FILE, 'r', encoding='utf-8') as f: return json.load(f)
-    except: return {"user_facts": []}
+        cache = client.caches.create(
+            model="gemini-2.5-flash",
+            config=types.CreateCachedContentConfig(
+                system_instruction=sys_prompt,
+                ttl=f"{PROMPT_CACHE_TTL_S}s"
+            )
+        )
+        name = cache.name
+    except Exception:
+        name = None
+    with _prompt_caches_lock:
+        _prompt_caches_pending.discard(sys_prompt)
+        # Refresh a minute early so we never reference an expired cache.
+        # A failed create is remembered too, so it isn't retried every turn.
+        _prompt_caches[sys_prompt] = (name, time.time() + PROMPT_CACHE_TTL_S - 60)
 
-def save_memory(data):
-    with open(MEMORY_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def prompt_config(sys_prompt, **kwargs):
+    """
+    GenerateContentConfig that references a Gemini context cache holding `sys_prompt`
+    when one is ready; otherwise an inline system_instruction. Cache creation runs
+    in a background thread and never blocks the turn.
+    """
+    name = None
+    if len(sys_prompt) >= PROMPT_CACHE_MIN_CHARS:
+        with _prompt_caches_lock:
+            name, expires_at = _prompt_caches.get(sys_prompt, (None, 0))
+            if time.time() >= expires_at:
+                name = None
+                if sys_prompt not in _prompt_caches_pending:
+                    _prompt_caches_pending.add(sys_prompt)
+                    threading.Thread(target=_create_prompt_cache, args=(sys_prompt,), daemon=True).start()
+
+    if name:
+        return types.GenerateContentConfig(cached_content=name, **kwargs)
+    return types.GenerateContentConfig(system_instruction=sys_prompt, **kwargs)
+
+def invalidate_prompt_caches():
+    """Drops all prompt caches (facts changed, so the cached prompts are stale). Deletes run in the background."""
+    with _prompt_caches_lock:
+        names = [name for name, _ in _prompt_caches.values() if name]
+        _prompt_caches.clear()
+    if not names:
+        return
+
+    def _delete():
+        for name in names:
+            try:
+                client.caches.delete(name=name)
+            except Exception:
+                pass
+    threading.Thread(target=_delete, daemon=True).start()
+
+def get_piper_voice(lang):
+    """Loads the Piper voice for `lang` once. None if piper or the model is missing or broken."""
+    if lang not in _piper_voices:
+        voice = None
+        model_path = PIPER_MODELS.get(lang)
+        if model_path and os.path.exists(model_path):
+            try:
+                from piper import PiperVoice
+                voice = PiperVoice.load(model_path)
+            except ImportError:
+                pass
+            except Exception as e:
+                # Missing .onnx.json or a broken model: report once, then stay on gTTS
+                print(f"⚠️ Piper voice {model_path} failed to load: {e}")
+        _piper_voices[lang] = voice
+    return _piper_voices[lang]
+
+def speak_piper(text, voice):
+    """Streams Piper PCM straight into aplay: no network, no mp3/wav files."""
+    from piper import SynthesisConfig
+
+    cmd = ['aplay', '-q', '-D', ALSA_DEVICE, '-t', 'raw', '-f', 'S16_LE', '-c', '1',
+           '-r', str(voice.config.sample_rate)]
+    player = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=PIPE_BUFSIZE)
+    try:
+        for chunk in voice.synthesize(text, syn_config=SynthesisConfig(length_scale=1 / TTS_SPEED)):
+            player.stdin.write(chunk.audio_int16_bytes)
+    finally:
+        player.stdin.close()
+        player.wait()
+
+def get_tts_mp3(text, lang):
+    """Returns a cached gTTS MP3 for (lang, text), synthesizing it on a miss."""
+    key = hashlib.sha1((lang + "|" + text).encode("utf-8")).hexdigest()
+    path = os.path.join(TTS_CACHE_DIR, f"{key}.mp3")
+    if os.path.exists(path):
+        os.utime(path)  # Mark as recently used
+        return path
+
+    os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+    gTTS(text=text, lang=lang).save(path + ".part")
+    os.replace(path + ".part", path)  # Never leave a half-written MP3 in the cache
+
+    # LRU eviction: drop the least recently used files above the limit
+    cached = sorted(os.scandir(TTS_CACHE_DIR), key=lambda e: e.stat().st_mtime)
+    for entry in cached[:-TTS_CACHE_MAX_FILES]:
+        os.remove(entry.path)
+    return path
+
+def play_via_ffmpeg(mp3):
+    """Debug path (USE_FFMPEG=1): MP3 -> WAV with ffmpeg, then aplay."""
+    subprocess.run(["ffmpeg", "-y", *FFMPEG_LOW_LATENCY, "-i", mp3, TMP_WAV], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        subprocess.run(['aplay', '-D', ALSA_DEVICE, *APLAY_LOW_LATENCY, TMP_WAV], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    except:
+        subprocess.run(['aplay', *APLAY_LOW_LATENCY, TMP_WAV], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def play_mp3_in_process(mp3):
+    """Decodes MP3 with miniaudio and writes S16 PCM straight to ALSA (no subprocesses)."""
+    decoded = miniaudio.decode_file(mp3, output_format=miniaudio.SampleFormat.SIGNED16, nchannels=1)
+    pcm = alsaaudio.PCM(alsaaudio.PCM_PLAYBACK, device=ALSA_DEVICE, channels=1, rate=decoded.sample_rate,
+                        format=alsaaudio.PCM_FORMAT_S16_LE, periodsize=ALSA_PERIOD_FRAMES)
+    try:
+        data = decoded.samples.tobytes()
+        step = ALSA_PERIOD_FRAMES * 2  # 16-bit mono
+        for i in range(0, len(data), step):
+            pcm.write(data[i:i + step])
+    finally:
+        pcm.close()
 
 def speak(text, lang='ru'):
     print(f"🤖 AI ({lang}): {text}")
-    mp3 = os.path.join(SCRIPT_DIR, "output.mp3")
-    wav = os.path.join(SCRIPT_DIR, "output.wav")
+    if sys.platform != "darwin":
+        try:
+            voice = get_piper_voice(lang)
+            if voice:
+                speak_piper(text, voice)
+                return
+        except Exception as e:
+            print(f"⚠️ Piper error: {e}. Falling back to gTTS.")
+
     try:
-        gTTS(text=text, lang=lang).save(mp3)
+        mp3 = get_tts_mp3(text, lang)
         if sys.platform == "darwin":
             subprocess.run(['afplay', '--rate', str(TTS_SPEED), mp3])
+        elif USE_FFMPEG:
+            play_via_ffmpeg(mp3)
+        elif not MPG123_AVAILABLE and INPROC_AUDIO_AVAILABLE:
+            play_mp3_in_process(mp3)
         else:
-            subprocess.run(["ffmpeg", "-y", "-i", mp3, wav], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            # mpg123 decodes + plays in one process, no temp WAV
             try:
-                subprocess.run(['aplay', '-D', ALSA_DEVICE, wav], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-            except:
-                subprocess.run(['aplay', wav], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                subprocess.run(['mpg123', '-q', '-o', 'alsa', '-a', ALSA_DEVICE, mp3], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            except subprocess.CalledProcessError:
+                # BT sink missing or disconnected: retry on the default device
+                subprocess.run(['mpg123', '-q', mp3], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
     except Exception as e: print(f"❌ TTS Error: {e}")
-    finally:
-        for f in [mp3, wav]:
-            if os.path.exists(f): os.remove(f)
 
-def record_voice(button_pin, use_polling):
+def record_voice(button):
+    """
+    Streams raw 16 kHz PCM from arecord (no WAV on disk). Stops on button
+    release or, with webrtcvad, on 800 ms of silence after speech.
+    Without a button (PC mode) ENTER stops the recording.
+    Returns the PCM bytes (None if nothing was recorded).
+    """
     print("🎤 Listening...")
-    cmd = ["arecord", "-D", MIC_DEVICE, "-f", "S16_LE", "-r", "16000", "-c", "1", TEMP_WAV]
     if sys.platform == "darwin":
-        print("(Simulating recording...)"); time.sleep(2); return True
-    
-    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    
-    if GPIO_AVAILABLE:
-        if not use_polling:
-            Button(button_pin).wait_for_release()
-        else:
-            import RPi.GPIO as GPIO
-            while GPIO.input(button_pin) == GPIO.LOW: time.sleep(0.05)
+        print("(Simulating recording...)"); time.sleep(2); return None
+
+    frame_bytes = SAMPLE_RATE * VAD_FRAME_MS // 1000 * 2  # 16-bit mono
+    cmd = ["arecord", "-q", "-D", MIC_DEVICE, "-f", "S16_LE", "-r", str(SAMPLE_RATE), "-c", "1", "-t", "raw"]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=PIPE_BUFSIZE)
+    frames = []
+
+    if button:
+        vad = webrtcvad.Vad(3) if VAD_AVAILABLE else None
+        silence_limit = VAD_SILENCE_MS // VAD_FRAME_MS
+        speech_started, silent_frames = False, 0
+        while button.is_pressed:
+            frame = process.stdout.read(frame_bytes)
+            if len(frame) < frame_bytes: break
+            frames.append(frame)
+            if vad:
+                if vad.is_speech(frame, SAMPLE_RATE):
+                    speech_started, silent_frames = True, 0
+                elif speech_started:
+                    silent_frames += 1
+                    if silent_frames >= silence_limit: break
+        process.terminate()
+        process.wait()
     else:
+        def drain():
+            for frame in iter(lambda: process.stdout.read(frame_bytes), b""):
+                frames.append(frame)
+        reader = threading.Thread(target=drain, daemon=True)
+        reader.start()
         input("🎤 Recording... Press ENTER to stop")
-    
-    process.terminate()
-    process.wait()
-    return os.path.exists(TEMP_WAV)
+        process.terminate()
+        process.wait()
+        reader.join()
+
+    return b"".join(frames) or None
+
+# One Recognizer for the whole app, static thresholds (no adaptive energy loop)
+_REC = sr.Recognizer()
+_REC.dynamic_energy_threshold = False
+_REC.energy_threshold = 300
+_REC.pause_threshold = 0.6
 
-def get_stt(lang="ru-RU"):
-    r = sr.Recognizer()
+def get_stt(raw, lang="ru-RU"):
+    """Recognizes raw S16_LE 16 kHz mono PCM (no WAV parsing)."""
     try:
-        with sr.AudioFile(TEMP_WAV) as source:
-            audio = r.record(source)
-        return r.recognize_google(audio, language=lang)
+        return _REC.recognize_google(sr.AudioData(raw, SAMPLE_RATE, 2), language=lang)
     except: return None
 
+_camera = None
+
+def _release_camera():
+    """atexit: releases whichever capture is open at exit (registered once)."""
+    if _camera is not None:
+        _camera.release()
+
+atexit.register(_release_camera)
+
+def get_camera():
+    """Opens the webcam once and keeps it open (V4L2 open + warmup is slow on Pi)."""
+    global _camera
+    if _camera is None or not _camera.isOpened():
+        backend = cv2.CAP_V4L2 if sys.platform.startswith("linux") else cv2.CAP_ANY
+        _camera = cv2.VideoCapture(CAMERA_INDEX, backend)
+        _camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        _camera.set(cv2.CAP_PROP_FRAME_WIDTH, CAPTURE_SIZE[0])
+        _camera.set(cv2.CAP_PROP_FRAME_HEIGHT, CAPTURE_SIZE[1])
+        time.sleep(0.5)  # Auto-exposure warmup, once
+    return _camera
+
+def capture_frame():
+    """Grabs a fresh frame from the persistent camera."""
+    global _camera
+    cap = get_camera()
+    for _ in range(2): cap.grab()  # Drop stale buffered frames
+    ret, frame = cap.retrieve()
+    if not ret:
+        cap.release(); _camera = None  # Reopen next time
+    return ret, frame
+
+def encode_jpeg(frame):
+    """Downscales a frame and JPEG-encodes it in memory (no disk round-trip)."""
+    h, w = frame.shape[:2]
+    scale = MAX_IMAGE_SIDE / max(h, w)
+    if scale < 1:
+        frame = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    return buf.tobytes() if ok else None
+
 # --- CORE LOGIC ---
-def handle_assistant(memory, use_polling):
-    if record_voice(BTN_ASSISTANT_PIN, use_polling):
-        text = get_stt("ru-RU")
+# One long-lived loop: client.aio keeps pooled connections bound to it across turns
+_loop = asyncio.new_event_loop()
+
+async def assistant_turn(memory, text):
+    """Observer and Chat are independent, so both Gemini calls run concurrently."""
+    sys_obs = "Ты - ИИ-Архивариус. Если пользователь сказал факт о себе, верни JSON: {\"new_fact\": \"факт\"}. Иначе {}"
+    sys_chat = f"Ты - ИИ-Кент, лучший бро. Твой стиль: максимально кратко, лаконично, по сути. Никакой воды. Отвечай как реальный кент в телеге. ПАМЯТЬ:\n{memory['_facts_joined']}"
+
+    obs_resp, chat_resp = await asyncio.gather(
+        client.aio.models.generate_content(model="gemini-2.5-flash", config=prompt_config(sys_obs, response_mime_type="application/json"), contents=text),
+        client.aio.models.generate_content(model="gemini-2.5-flash", config=prompt_config(sys_chat), contents=text),
+        return_exceptions=True
+    )
+
+    # 1. Chat: start speaking right away (in a thread) ...
+    reply = "Бро, связь лагает..." if isinstance(chat_resp, Exception) else chat_resp.text
+    speaking = asyncio.create_task(asyncio.to_thread(speak, reply, 'ru'))
+
+    # 2. ... while the Observer's fact is saved
+    try:
+        new_fact = json.loads(obs_resp.text).get("new_fact")
+        if new_fact and new_fact not in memory["_text_index"]:
+            memory["_text_index"].add(new_fact)
+            today = datetime.date.today().isoformat()
+            memory["user_facts"].append({"text": new_fact, "created_at": today})
+            memory["_facts_joined"] += ("\n" if memory["_facts_joined"] else "") + f"- {new_fact}"
+            save_memory(memory); print(f"🧠 Saved: {new_fact}")
+    except: pass
+
+    await speaking
+
+def handle_assistant(memory, button=None):
+    raw = record_voice(button)
+    if raw:
+        text = get_stt(raw, "ru-RU")
         if not text: return
         print(f"🗣️ You: {text}")
-        
-        # 1. Observer (Fact Extraction)
-        sys_obs = "Ты - ИИ-Архивариус. Если пользователь сказал факт о себе, верни JSON: {\"new_fact\": \"факт\"}. Иначе {}"
-        try:
-            resp = client.models.generate_content(model="gemini-2.5-flash", config=types.GenerateContentConfig(system_instruction=sys_obs, response_mime_type="application/json"), contents=text)
-            new_fact = json.loads(resp.text).get("new_fact")
-            if new_fact:
-                today = datetime.date.today().isoformat()
-                memory["user_facts"].append({"text": new_fact, "created_at": today})
-                save_memory(memory); print(f"🧠 Saved: {new_fact}")
-        except: pass
-
-        # 2. Chat
-        facts = "\n".join([f"- {f['text']}" for f in memory["user_facts"]])
-        sys_chat = f"Ты - ИИ-Кент, лучший бро. Твой стиль: максимально кратко, лаконично, по сути. Никакой воды. Отвечай как реальный кент в телеге. ПАМЯТЬ:\n{facts}"
-        try:
-            resp = client.models.generate_content(model="gemini-2.5-flash", config=types.GenerateContentConfig(system_instruction=sys_chat), contents=text)
-            speak(resp.text, 'ru')
-        except: speak("Бро, связь лагает...", 'ru')
+        _loop.run_until_complete(assistant_turn(memory, text))
 
-def handle_translator(use_polling):
+def handle_translator(button=None):
     mode = trans_modes[current_trans_idx]
-    if record_voice(BTN_TRANSLATOR_PIN, use_polling):
-        text = get_stt(mode["in"])
+    raw = record_voice(button)
+    if raw:
+        text = get_stt(raw, mode["in"])
         if not text: return
         print(f"🗣️ In: {text}")
         try:
-            translation = GoogleTranslator(source='auto', target=mode["out"]).translate(text)
+            translation = _translate(text, mode["out"])
             speak(translation, mode["out"])
         except: print("❌ Translation error")
 
-def handle_vision(memory, use_polling):
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    photo_path = os.path.join(PHOTOS_DIR, f"photo_{timestamp}.jpg")
-    
+def handle_vision(memory, button=None):
     # Take Photo
-    cap = cv2.VideoCapture(int(os.getenv("CAMERA_INDEX", 0)))
-    time.sleep(0.5); ret, frame = cap.read(); cap.release()
-    if not ret: speak("Камера не пашет", 'ru'); return
-    cv2.imwrite(photo_path, frame); print(f"📸 Photo: {photo_path}")
+    ret, frame = capture_frame()
+    jpeg = encode_jpeg(frame) if ret else None
+    if not jpeg: speak("Камера не пашет", 'ru'); return
+    print("📸 Photo taken")
+    if SAVE_PHOTOS:
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        photo_path = os.path.join(PHOTOS_DIR, f"photo_{timestamp}.jpg")
+        with open(photo_path, 'wb') as f: f.write(jpeg)
+        print(f"💾 Saved: {photo_path}")
 
     # Check for hold
-    is_holding = False
-    time.sleep(0.3)
-    if GPIO_AVAILABLE:
-        import RPi.GPIO as GPIO
-        if GPIO.input(BTN_VISION_PIN) == GPIO.LOW: is_holding = True
+    # Still pressed after 0.3 s (no release edge) -> it's a hold
+    is_holding = bool(button) and not button.wait_for_release(timeout=0.3)
     
     user_text = "Что на фото?"
     if is_holding:
-        if record_voice(BTN_VISION_PIN, use_polling):
-            user_text = get_stt("ru-RU") or user_text
+        raw = record_voice(button)
+        if raw:
+            user_text = get_stt(raw, "ru-RU") or user_text
     
     # Analyze
-    facts = "\n".join([f"- {f['text']}" for f in memory["user_facts"]])
-    sys_vision = f"Ты - ИИ-Кент с глазами. Отвечай максимально лаконично и по делу. Только суть того, что видишь. ПАМЯТЬ:\n{facts}"
+    sys_vision = f"Ты - ИИ-Кент с глазами. Отвечай максимально лаконично и по делу. Только суть того, что видишь. ПАМЯТЬ:\n{memory['_facts_joined']}"
     try:
-        img = Image.open(photo_path)
-        resp = client.models.generate_content(model="gemini-2.5-flash", config=types.GenerateContentConfig(system_instruction=sys_vision), contents=[user_text, img])
+        img = types.Part.from_bytes(data=jpeg, mime_type="image/jpeg")
+        resp = client.models.generate_content(model="gemini-2.5-flash", config=prompt_config(sys_vision), contents=[user_text, img])
         speak(resp.text, 'ru')
     except: speak("Я ослеп, бро...", 'ru')
 
@@ -185,15 +501,16 @@ def main():
     if not os.path.exists(PHOTOS_DIR): os.makedirs(PHOTOS_DIR)
     
     memory = load_memory()
-    use_polling = False
-    
+    get_camera()  # Open once at startup, not per photo
+    buttons = {}
+    presses = queue.Queue()
+
     if GPIO_AVAILABLE:
-        import RPi.GPIO as GPIO
-        GPIO.setmode(GPIO.BCM)
+        # Edge-triggered: gpiozero sleeps on the GPIO fd, the main thread blocks on the queue
         for pin in [BTN_ASSISTANT_PIN, BTN_TRANSLATOR_PIN, BTN_VISION_PIN]:
-            GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-        use_polling = True # Using manual polling for maximum reliability on Pi
-        print("✅ Buttons ready (GPIO Polling Mode)")
+            buttons[pin] = Button(pin)
+            buttons[pin].when_pressed = lambda pin=pin: presses.put(pin)
+        print("✅ Buttons ready (GPIO Edge Mode)")
     else:
         print("⚠️ GPIO not available. Running in PC mode.")
 
@@ -201,37 +518,34 @@ def main():
 
     try:
         while True:
-            if GPIO_AVAILABLE:
-                import RPi.GPIO as GPIO
-                if GPIO.input(BTN_ASSISTANT_PIN) == GPIO.LOW:
-                    handle_assistant(memory, True)
-                elif GPIO.input(BTN_TRANSLATOR_PIN) == GPIO.LOW:
+            if buttons:
+                pin = presses.get()
+                btn = buttons[pin]
+                if pin == BTN_ASSISTANT_PIN:
+                    handle_assistant(memory, btn)
+                elif pin == BTN_TRANSLATOR_PIN:
                     # 1. Wait a bit to see if it's a HOLD or a CLICK
-                    time.sleep(0.2)
-                    if GPIO.input(BTN_TRANSLATOR_PIN) == GPIO.LOW:
+                    if not btn.wait_for_release(timeout=0.2):
                         # Still held -> Start recording (Hold-to-record)
-                        handle_translator(True)
-                    else:
-                        # Released quickly -> Check for second click (Double-click)
-                        time.sleep(0.2)
-                        if GPIO.input(BTN_TRANSLATOR_PIN) == GPIO.LOW:
-                            global current_trans_idx
-                            current_trans_idx = (current_trans_idx + 1) % 2
-                            mode = trans_modes[current_trans_idx]
-                            speak(f"Режим {mode['label']}", 'ru')
-                            # Wait for release of the second click
-                            while GPIO.input(BTN_TRANSLATOR_PIN) == GPIO.LOW:
-                                time.sleep(0.05)
-                
-                elif GPIO.input(BTN_VISION_PIN) == GPIO.LOW:
-                    handle_vision(memory, True)
-                
-                time.sleep(0.05)
+                        handle_translator(btn)
+                    # Released quickly -> Check for second click (Double-click)
+                    elif btn.wait_for_press(timeout=0.2):
+                        global current_trans_idx
+                        current_trans_idx = (current_trans_idx + 1) % 2
+                        mode = trans_modes[current_trans_idx]
+                        speak(f"Режим {mode['label']}", 'ru')
+                elif pin == BTN_VISION_PIN:
+                    handle_vision(memory, btn)
+
+                # VAD can end the turn while the button is still held
+                btn.wait_for_release()
+                # Drop presses that arrived while the handler was busy
+                while not presses.empty(): presses.get_nowait()
             else:
                 cmd = input("\n[1] Assistant [2] Translator [3] Vision [D] Toggle Lang: ").lower()
-                if cmd == '1': handle_assistant(memory, False)
-                elif cmd == '2': handle_translator(False)
-                elif cmd == '3': handle_vision(memory, False)
+                if cmd == '1': handle_assistant(memory)
+                elif cmd == '2': handle_translator()
+                elif cmd == '3': handle_vision(memory)
                 elif cmd == 'd':
                     current_trans_idx = (current_trans_idx + 1) % 2
                     print(f"Mode: {trans_modes[current_trans_idx]['label']}")
@@ -0,0 +1,61 @@
+"""
+Общие Recognizer и Microphone на процесс: создаются лениво и один раз.
+Калибровка шума идёт максимум раз за процесс (или берётся из mic.json, если свежая).
+"""
+import os
+import json
+import time
+import threading
+import speech_recognition as sr
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pi_translator")
+MIC_CALIBRATION_FILE = os.path.join(CACHE_DIR, "mic.json")
+MIC_CALIBRATION_MAX_AGE_S = 3600
+
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+_recognizers = {}  # device_index -> sr.Recognizer, откалиброванный под этот микрофон
+_microphones = {}  # device_index -> sr.Microphone
+_lock = threading.Lock()
+
+def load_mic_calibration(device_index=None):
+    """energy_threshold из mic.json для этого микрофона, если ему меньше часа, иначе None."""
+    try:
+        with open(MIC_CALIBRATION_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("mic_index") != device_index or time.time() - data.get("ts", 0) > MIC_CALIBRATION_MAX_AGE_S:
+        return None
+    return data.get("energy_threshold")
+
+def save_mic_calibration(energy_threshold, device_index=None):
+    with open(MIC_CALIBRATION_FILE, 'w', encoding='utf-8') as f:
+        json.dump({"mic_index": device_index, "energy_threshold": energy_threshold, "ts": time.time()}, f)
+
+def get_microphone(device_index=None):
+    """sr.Microphone для device_index (ALSA-устройство открывается только внутри `with`)."""
+    with _lock:
+        if device_index not in _microphones:
+            _microphones[device_index] = sr.Microphone(device_index=device_index)
+        return _microphones[device_index]
+
+def get_recognizer(device_index=None):
+    """Recognizer для device_index: порог из mic.json, а без свежего кэша - одна калибровка по микрофону."""
+    mic = get_microphone(device_index)
+    with _lock:
+        if device_index not in _recognizers:
+            recognizer = sr.Recognizer()
+            cached_threshold = load_mic_calibration(device_index)
+            if cached_threshold:
+                # Калибровка из прошлого запуска: без блокирующего замера
+                recognizer.energy_threshold = cached_threshold
+                print(f"🎧 Using cached mic calibration ({cached_threshold:.0f})")
+            else:
+                print("🎧 Calibrating ambient noise...")
+                with mic as source:
+                    recognizer.adjust_for_ambient_noise(source, duration=0.5)
+                save_mic_calibration(recognizer.energy_threshold, device_index)
+            recognizer.dynamic_energy_threshold = False
+            _recognizers[device_index] = recognizer
+        return _recognizers[device_index]
@@ -0,0 +1,97 @@
+"""
+Память переводов: повторная фраза не ходит в Google.
+Уровень 1 - lru_cache в процессе, уровень 2 - shelve на диске (переживает перезапуск).
+"""
+import os
+import atexit
+import shelve
+import threading
+from functools import lru_cache
+import requests
+from requests.adapters import HTTPAdapter
+from deep_translator import GoogleTranslator
+from deep_translator import google as _dt_google
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pi_translator")
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+TM_FILE = os.path.join(CACHE_DIR, "tm.db")
+_tm = None          # shelve открывается при первом промахе lru, не при импорте
+_tm_failed = False  # Не открылся: работаем без дискового уровня
+_tm_lock = threading.Lock()  # shelve/dbm не потокобезопасны
+
+def _get_tm():
+    """Shelve с переводами (вызывать под _tm_lock). None, если его держит другой процесс (gdbm)."""
+    global _tm, _tm_failed
+    if _tm is None and not _tm_failed:
+        try:
+            _tm = shelve.open(TM_FILE)
+            atexit.register(_tm.close)
+        except Exception as e:
+            _tm_failed = True
+            print(f"⚠️ Translation memory unavailable ({e}), using in-memory cache only.")
+    return _tm
+
+# deep_translator вызывает requests.get() модуля на каждый перевод -> новый TLS-хендшейк.
+# Подменяем его на keep-alive Session: соединение с Google переиспользуется.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+
+class _SessionRequests:
+    """Как модуль requests, но get() идёт через общую Session."""
+    get = staticmethod(_SESSION.get)
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+if getattr(_dt_google, "requests", None) is requests:
+    _dt_google.requests = _SessionRequests()
+
+# GoogleTranslator хранит текст запроса в self._url_params до requests.get():
+# один объект на несколько потоков путает фразы. Поэтому - свой объект на поток.
+_local = threading.local()
+
+def _get_translator(src, tgt):
+    """GoogleTranslator для (src, tgt), создаётся один раз на поток."""
+    translators = getattr(_local, "translators", None)
+    if translators is None:
+        translators = _local.translators = {}
+    if (src, tgt) not in translators:
+        translators[(src, tgt)] = GoogleTranslator(source=src, target=tgt)
+    return translators[(src, tgt)]
+
+class _NoTranslation(Exception):
+    """Пустой ответ: исключение, чтобы lru_cache его не запомнил."""
+
+@lru_cache(maxsize=512)
+def _translate_cached(src, tgt, text):
+    key = f"{src}\0{tgt}\0{text}"
+    with _tm_lock:
+        tm = _get_tm()
+        if tm is not None and key in tm:
+            return tm[key]
+    translation = _get_translator(src, tgt).translate(text)
+    if not translation:
+        raise _NoTranslation(translation)
+    with _tm_lock:
+        tm = _get_tm()
+        if tm is not None:
+            tm[key] = translation
+            tm.sync()
+    return translation
+
+def translate(src, tgt, text):
+    """Перевод с кэшем: lru -> диск -> GoogleTranslator (только при промахе). Пустые ответы не кэшируются."""
+    try:
+        return _translate_cached(src, tgt, text)
+    except _NoTranslation as e:
+        return e.args[0]
+
+def warmup(targets=('en', 'ru')):
+    """В фоне: DNS + TLS к Google готовы до первой фразы (запрос мимо кэшей)."""
+    def _run():
+        for tgt in targets:
+            try:
+                _get_translator('auto', tgt).translate("hi")
+            except Exception:
+                pass  # Best effort: настоящий запрос сам сообщит об ошибке
+    threading.Thread(target=_run, daemon=True).start()
@@ -1,25 +1,16 @@
-import sys
-from deep_translator import GoogleTranslator
 from requests.exceptions import ConnectionError, Timeout
+from translation_memory import translate
+
+_EXIT = frozenset(('exit', 'quit', 'выход', 'q'))
 
 def main():
     print("\n" + "="*40)
     print("   🌍 Free Google Translator for Pi")
     print("="*40)
     
-    # Initialize translator
-    # source='auto' is good, but specifying 'ru' can be slightly faster/more accurate if we know input is RU.
-    # Let's stick to auto for flexibility, or 'ru' if user strictly said "RU -> EN".
-    # User said: "Запрос пользователя (текст на русском) -> перевод"
-    # Let's use auto to be safe, or allow user to switch? 
-    # Simple is best: Auto -> English.
-    
-    try:
-        translator = GoogleTranslator(source='auto', target='en')
-        print("✅ Ready! No API Key needed.")
-    except Exception as e:
-        print(f"❌ Initialization Error: {e}")
-        sys.exit(1)
+    # Auto -> English. Translations go through translation_memory (LRU + on-disk cache),
+    # so repeated phrases skip the HTTP call.
+    print("✅ Ready! No API Key needed.")
 
     print("\n🔹 Ready to translate (Auto -> EN).")
     print("🔹 Type 'exit' or press Ctrl+C to quit.\n")
@@ -27,8 +18,9 @@ def main():
     while True:
         try:
             text = input("📝 Enter text: ").strip()
+            lt = text.lower()
             
-            if text.lower() in ('exit', 'quit'):
+            if lt in _EXIT:
                 print("👋 Goodbye!")
                 break
             
@@ -36,7 +28,7 @@ def main():
                 continue
 
             # Perform translation
-            translation = translator.translate(text)
+            translation = translate('auto', 'en', text)
             
             print(f"🇺🇸 Translation: {translation}")
             print("-" * 20)
@@ -1,44 +1,59 @@
-import os
-import sys
+import re
+import shutil
 import subprocess
-from deep_translator import GoogleTranslator
-from gtts import gTTS
+from concurrent.futures import ThreadPoolExecutor
 from requests.exceptions import ConnectionError, Timeout
+import tts_cache
+import translation_memory
+from translation_memory import translate
 
 # --- ГЛОБАЛЬНЫЕ НАСТРОЙКИ ALSA ---
 # Принудительно используем ваше устройство BlueALSA
 ALSA_DEVICE = "bluealsa" 
 # ---
 
+# Путь к aplay ищем в PATH один раз, а не при каждом запуске процесса
+_APLAY = shutil.which("aplay") or "aplay"
+
+# Границы предложений: длинный абзац переводится и озвучивается по частям
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+_EXIT = frozenset(('exit', 'quit', 'выход', 'q'))
+
 def speak(text, lang):
     """
-    Синтезирует речь с помощью gTTS, конвертирует в WAV 
-    и воспроизводит через системную утилиту aplay.
+    Воспроизводит фразу через BlueALSA.
+    С моделью Piper: синтез на месте, без сети (PI_TTS_ONLINE=1 - всегда gTTS).
+    С miniaudio: PCM пишется в постоянный aplay (устройство открыто один раз).
+    Иначе:
+    Новая фраза: MP3 от gTTS сразу стримится в mpg123 (и пишется в кэш), без временных файлов.
+    Знакомая фраза: WAV из дискового кэша (tts_cache) -> aplay, без сети.
     Это надежный метод для Raspberry Pi OS Lite.
     """
-    mp3_filename = "output_tts.mp3"
-    wav_filename = "output_tts.wav"
-
-    print("🔈 Generating TTS file...")
-
     try:
-        # 1. ГЕНЕРАЦИЯ: gTTS -> MP3
-        tts = gTTS(text=text, lang=lang)
-        tts.save(mp3_filename)
-        
-        # 2. КОНВЕРТАЦИЯ: MP3 -> WAV (с помощью mpg123)
-        print("🛠️ Converting MP3 to WAV...")
-        subprocess.run(
-            ['mpg123', '-w', wav_filename, mp3_filename], 
-            stdout=subprocess.DEVNULL, 
-            stderr=subprocess.DEVNULL, 
-            check=True
-        )
+        voice = tts_cache.get_piper_voice(lang)
+        if voice:
+            tts_cache.play_piper(text, voice, ALSA_DEVICE)
+            return
+    except Exception as e:
+        print(f"⚠️ Piper Error: {e}. Falling back to gTTS.")
 
-        # 3. ВОСПРОИЗВЕДЕНИЕ: WAV -> BlueALSA (с помощью aplay)
+    try:
+        if tts_cache.MINIAUDIO_AVAILABLE:
+            # 0. Постоянный aplay: без открытия устройства на каждую фразу
+            tts_cache.play_resident(text, lang, ALSA_DEVICE)
+            return
+
+        if not tts_cache.is_cached(text, lang):
+            # 1. СТРИМИНГ: gTTS -> stdin mpg123 -> BlueALSA
+            print("🔊 Streaming via MPG123...")
+            tts_cache.stream(text, lang, ALSA_DEVICE)
+            return
+
+        # 2. КЭШ: WAV -> BlueALSA (с помощью aplay)
+        wav_filename = tts_cache.get_or_synth(text, lang)
         print("🔊 Playing via APLAY...")
         subprocess.run(
-            ['aplay', '-D', ALSA_DEVICE, wav_filename],
+            [_APLAY, '-D', ALSA_DEVICE, wav_filename],
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL,
             check=True
@@ -51,13 +66,14 @@ def speak(text, lang):
         print("Run (outside venv): sudo apt install mpg123 alsa-utils")
     except Exception as e:
         print(f"❌ TTS Error: {e}")
-    
-    finally:
-        # 4. ОЧИСТКА: Удаляем временные файлы
-        if os.path.exists(mp3_filename):
-            os.remove(mp3_filename)
-        if os.path.exists(wav_filename):
-            os.remove(wav_filename)
+
+
+def translate_and_fetch(text):
+    """Перевод + загрузка MP3 одной задачей пула: сеть для фразы N+1 идёт, пока звучит N."""
+    translation = translate('auto', 'en', text)
+    if translation:
+        tts_cache.fetch(translation, 'en')
+    return translation
 
 
 def main():
@@ -66,35 +82,51 @@ def main():
     print("  (Type text -> Hear translation)")
     print("="*50)
     
-    try:
-        # Инициализация переводчика
-        translator = GoogleTranslator(source='auto', target='en')
-        print("✅ Ready! Type in Russian, hear in English.")
-    except Exception as e:
-        print(f"❌ Initialization Error: {e}")
-        sys.exit(1)
+    # Переводы идут через translation_memory (LRU + кэш на диске)
+    # Прогрев соединений с Google, пока пользователь печатает первую фразу
+    translation_memory.warmup(('en',))
+    tts_cache.warmup(('en',))
+    print("✅ Ready! Type in Russian, hear in English.")
 
     print("🔹 Type 'exit' to quit.\n")
 
+    # Озвучка идёт в фоне (один поток -> фразы по порядку, без наложения aplay),
+    # поэтому следующий ввод и перевод выполняются, пока играет предыдущая фраза
+    speech = ThreadPoolExecutor(max_workers=1)
+    translation_pool = ThreadPoolExecutor(max_workers=2)
+
     while True:
         try:
             text = input("📝 Enter text: ").strip()
+            lt = text.lower()
 
-            if text.lower() in ('exit', 'quit'):
+            if lt in _EXIT:
                 print("👋 Goodbye!")
+                speech.shutdown(wait=True)  # Договариваем начатое
                 break
 
             if not text:
                 continue
 
+            sentences = SENTENCE_SPLIT_RE.split(text)
+            if len(sentences) > 1:
+                # Абзац: предложение N+1 переводится и скачивается, пока звучит N.
+                # Результаты забираем в порядке отправки -> озвучка по порядку.
+                futures = [translation_pool.submit(translate_and_fetch, s) for s in sentences]
+                for fut in futures:
+                    part = fut.result()
+                    print(f"🇺🇸 Translation: {part}")
+                    speech.submit(speak, part, 'en')
+                continue
+
             # 1. Translate
-            translation = translator.translate(text)
+            translation = translate('auto', 'en', text)
 
             # 2. Output
             print(f"🇺🇸 Translation: {translation}")
 
-            # 3. Speak (using the new reliable function)
-            speak(translation, 'en')
+            # 3. Speak in the background (don't wait for aplay)
+            speech.submit(speak, translation, 'en')
             
         except ConnectionError:
             print("❌ Connection Error. Check your Internet connection.")
@@ -102,6 +134,7 @@ def main():
             print("❌ Request Timed Out. Please try again.")
         except KeyboardInterrupt:
             print("\n👋 Goodbye!")
+            speech.shutdown(wait=False, cancel_futures=True)
             break
         except Exception as e:
             print(f"❌ An unexpected error occurred: {e}")
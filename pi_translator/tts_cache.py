@@ -0,0 +1,312 @@
+"""
+Дисковый LRU-кэш для gTTS: повторная фраза не ходит в сеть и не декодируется заново.
+Ключ: sha1(lang + "\\0" + text) -> ~/.cache/pi_translator/<key>.mp3 / <key>.wav
+Если есть модель Piper для языка - синтез локальный, gTTS и кэш не нужны.
+"""
+import io
+import os
+import wave
+import atexit
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+from gtts import gTTS
+
+try:
+    import miniaudio  # MP3 -> PCM прямо в процессе: без fork+exec mpg123 на каждую фразу
+    MINIAUDIO_AVAILABLE = True
+except ImportError:
+    MINIAUDIO_AVAILABLE = False
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pi_translator")
+MAX_ENTRIES = 200
+_MPG123 = shutil.which("mpg123") or "mpg123"  # PATH lookup once, not per decode
+_APLAY = shutil.which("aplay") or "aplay"
+
+# Постоянный aplay: BlueALSA (A2DP) открывается один раз, дальше фразы - просто запись в stdin
+PLAYER_RATE = 24000  # gTTS отдаёт MP3 24 кГц моно
+PLAYER_START_CHECK_S = 0.1  # aplay без BT-приёмника выходит сразу; столько ждём при запуске
+_player = None
+_player_rate = None
+_player_device = None  # None: устройство ALSA по умолчанию (запасной вариант)
+_player_lock = threading.Lock()
+
+# Офлайн TTS (Piper): модели (.onnx + .onnx.json) с https://github.com/rhasspy/piper
+VOICES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "voices")
+PIPER_MODELS = {
+    "ru": os.getenv("PIPER_MODEL_RU", os.path.join(VOICES_DIR, "ru_RU-irina-medium.onnx")),
+    "en": os.getenv("PIPER_MODEL_EN", os.path.join(VOICES_DIR, "en_US-lessac-low.onnx")),
+}
+TTS_ONLINE = bool(os.getenv("PI_TTS_ONLINE"))  # Принудительно gTTS вместо Piper
+_piper_voices = {}
+_piper_lock = threading.Lock()
+
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+def _key(text, lang):
+    return hashlib.sha1(f"{lang}\0{text}".encode("utf-8")).hexdigest()
+
+def _tmp_path(key):
+    """Уникальный временный файл в кэше: параллельные записи одного ключа не пишут в один файл."""
+    fd, tmp = tempfile.mkstemp(prefix=key + ".", suffix=".part", dir=CACHE_DIR)
+    os.close(fd)
+    return tmp
+
+def _discard(tmp):
+    try:
+        os.remove(tmp)
+    except FileNotFoundError:
+        pass
+
+_CACHE_EXTS = (".mp3", ".wav", ".part")
+
+def _evict():
+    """Удаляет самые старые записи (по mtime), если их больше MAX_ENTRIES."""
+    newest = {}
+    for entry in os.scandir(CACHE_DIR):
+        # В той же папке лежат mic.json и tm.db* - считаем только файлы TTS
+        if not entry.name.endswith(_CACHE_EXTS):
+            continue
+        try:
+            mtime = entry.stat().st_mtime
+        except FileNotFoundError:
+            continue  # .part другого потока успел переименоваться
+        key = entry.name.split(".", 1)[0]
+        newest[key] = max(newest.get(key, 0), mtime)
+    if len(newest) <= MAX_ENTRIES:
+        return
+    for key in sorted(newest, key=newest.get)[:len(newest) - MAX_ENTRIES]:
+        for ext in (".mp3", ".wav"):
+            try:
+                os.remove(os.path.join(CACHE_DIR, key + ext))
+            except FileNotFoundError:
+                pass
+
+def get_piper_voice(lang):
+    """Голос Piper для lang, загружается один раз. None: PI_TTS_ONLINE, нет piper, модели или она битая."""
+    if TTS_ONLINE:
+        return None
+    with _piper_lock:  # warmup/prefetch и speak() могут прийти одновременно
+        if lang not in _piper_voices:
+            voice = None
+            model_path = PIPER_MODELS.get(lang)
+            if model_path and os.path.exists(model_path):
+                try:
+                    from piper import PiperVoice
+                    voice = PiperVoice.load(model_path)
+                except ImportError:
+                    pass
+                except Exception as e:
+                    # Нет .onnx.json или битый ONNX: сообщаем один раз и остаёмся на gTTS
+                    print(f"⚠️ Piper voice {model_path} failed to load: {e}")
+            _piper_voices[lang] = voice
+        return _piper_voices[lang]
+
+def get_mp3(text, lang):
+    """MP3 из кэша; gTTS вызывается только при промахе."""
+    key = _key(text, lang)
+    mp3 = os.path.join(CACHE_DIR, key + ".mp3")
+    if os.path.exists(mp3):
+        os.utime(mp3)  # LRU: отмечаем использование
+        return mp3
+    tmp = _tmp_path(key)
+    try:
+        gTTS(text=text, lang=lang).save(tmp)
+    except Exception:
+        _discard(tmp)
+        raise
+    os.replace(tmp, mp3)  # Атомарно: недописанный файл никогда не попадёт в кэш
+    _evict()
+    return mp3
+
+def _mp3_to_wav(mp3, wav):
+    """Декодирует MP3 в 16-bit WAV: miniaudio в процессе, иначе mpg123."""
+    if MINIAUDIO_AVAILABLE:
+        pcm = miniaudio.mp3_read_file_s16(mp3)
+        with wave.open(wav, 'wb') as w:
+            w.setnchannels(pcm.nchannels)
+            w.setsampwidth(2)
+            w.setframerate(pcm.sample_rate)
+            w.writeframes(pcm.samples.tobytes())
+    else:
+        subprocess.run(
+            [_MPG123, '-q', '-w', wav, mp3],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True
+        )
+
+def get_or_synth(text, lang):
+    """WAV из кэша; при промахе gTTS -> MP3 -> WAV."""
+    key = _key(text, lang)
+    wav = os.path.join(CACHE_DIR, key + ".wav")
+    if os.path.exists(wav):
+        os.utime(wav)
+        return wav
+    mp3 = get_mp3(text, lang)
+    tmp = _tmp_path(key)
+    try:
+        _mp3_to_wav(mp3, tmp)
+    except Exception:
+        _discard(tmp)
+        raise
+    os.replace(tmp, wav)
+    return wav
+
+def fetch(text, lang):
+    """
+    Скачивает MP3 заранее (в потоке перевода), пока играет предыдущая фраза:
+    RTT к gTTS прячется за воспроизведением. Для голосов Piper ничего не делает.
+    """
+    if get_piper_voice(lang):
+        return
+    try:
+        get_mp3(text, lang)
+    except Exception:
+        pass  # Best effort: speak() повторит запрос и сообщит об ошибке
+
+def is_cached(text, lang):
+    """True, если MP3 фразы уже в кэше (сеть не нужна)."""
+    return os.path.exists(os.path.join(CACHE_DIR, _key(text, lang) + ".mp3"))
+
+class _Tee:
+    """Пишет поток сразу в плеер и в файл кэша; если плеер закрылся - только в файл."""
+    def __init__(self, player_stdin, cache_file):
+        self.player_stdin = player_stdin
+        self.cache_file = cache_file
+
+    def write(self, data):
+        self.cache_file.write(data)
+        if self.player_stdin:
+            try:
+                self.player_stdin.write(data)
+            except BrokenPipeError:
+                self.player_stdin = None
+
+def stream(text, lang, device):
+    """
+    Промах кэша: MP3 от gTTS по мере загрузки идёт в stdin mpg123 (звук начинается
+    с первых кадров) и одновременно сохраняется в кэш. Без промежуточного WAV.
+    """
+    key = _key(text, lang)
+    mp3 = os.path.join(CACHE_DIR, key + ".mp3")
+    tmp = _tmp_path(key)
+    player = subprocess.Popen(
+        [_MPG123, '-q', '-o', 'alsa', '-a', device, '-'],
+        stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with open(tmp, 'wb') as f:
+            gTTS(text=text, lang=lang).write_to_fp(_Tee(player.stdin, f))
+        os.replace(tmp, mp3)
+        _evict()
+    except Exception:
+        _discard(tmp)
+        raise
+    finally:
+        try:
+            player.stdin.close()
+        except BrokenPipeError:
+            pass
+        player.wait()
+    if player.returncode != 0:
+        # Нет BT-приёмника: MP3 уже в кэше, играем его на устройстве по умолчанию
+        subprocess.run([_MPG123, '-q', mp3], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+
+def _spawn_player(device, rate):
+    cmd = [_APLAY, '-q'] + (['-D', device] if device else []) + ['-t', 'raw', '-f', 'S16_LE', '-c', '1', '-r', str(rate)]
+    player = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        player.wait(timeout=PLAYER_START_CHECK_S)
+    except subprocess.TimeoutExpired:
+        pass  # Устройство открылось, aplay ждёт данные
+    return player
+
+def _get_player(device, rate=PLAYER_RATE):
+    """
+    Запускает resident aplay (raw S16_LE моно) при первом вызове, если он упал, сменилась
+    частота или он играет на запасном устройстве. Если device не открылся - устройство по умолчанию.
+    """
+    global _player, _player_rate, _player_device
+    if _player is not None and _player.poll() is None and (_player_rate != rate or _player_device != device):
+        # Голоса Piper бывают 16/22.05 кГц; на запасном устройстве каждый раз пробуем BT снова
+        _close_player()
+        _player = None
+    if _player is None or _player.poll() is not None:
+        _player, _player_device = _spawn_player(device, rate), device
+        if _player.poll() is not None and device:
+            _player, _player_device = _spawn_player(None, rate), None
+        _player_rate = rate
+    return _player
+
+def _close_player():
+    """При выходе даём aplay доиграть то, что уже в пайпе."""
+    if _player and _player.poll() is None:
+        try:
+            _player.stdin.close()
+            _player.wait(timeout=5)
+        except (BrokenPipeError, subprocess.TimeoutExpired):
+            _player.kill()
+
+atexit.register(_close_player)
+
+def _feed_player(device, rate, make_chunks):
+    """
+    Пишет фразу (make_chunks() -> куски PCM) в постоянный aplay + 200 мс тишины.
+    Если aplay умер посреди фразы (BT-приёмник пропал) - один повтор на устройстве по умолчанию.
+    """
+    global _player
+
+    def _write(player):
+        for data in make_chunks():
+            player.stdin.write(data)
+        player.stdin.write(b"\0" * (rate * 2 // 5))
+        player.stdin.flush()
+
+    with _player_lock:  # Фразы из разных потоков не перемешиваются
+        try:
+            _write(_get_player(device, rate))
+        except BrokenPipeError:
+            _close_player()
+            _player = None
+            _write(_get_player(None, rate))
+
+def play_resident(text, lang, device):
+    """MP3 (кэш или gTTS) -> PCM 24 кГц через miniaudio -> stdin постоянного aplay."""
+    pcm = miniaudio.decode_file(
+        get_mp3(text, lang), output_format=miniaudio.SampleFormat.SIGNED16,
+        nchannels=1, sample_rate=PLAYER_RATE
+    )
+    data = pcm.samples.tobytes()
+    _feed_player(device, PLAYER_RATE, lambda: (data,))
+
+def play_piper(text, voice, device):
+    """Piper синтезирует локально, PCM по кускам идёт в постоянный aplay: без сети и файлов."""
+    _feed_player(device, voice.config.sample_rate,
+                 lambda: (chunk.audio_int16_bytes for chunk in voice.synthesize(text)))
+
+def prefetch(phrases, wav=True):
+    """Заранее синтезирует фразы [(text, lang), ...] в фоне, чтобы первый вызов был мгновенным."""
+    def _run():
+        for text, lang in phrases:
+            try:
+                if get_piper_voice(lang):
+                    continue  # Piper синтезирует на лету, кэш не нужен
+                get_or_synth(text, lang) if wav else get_mp3(text, lang)
+            except Exception:
+                pass  # Best effort: speak() сам сообщит об ошибке
+    threading.Thread(target=_run, daemon=True).start()
+
+def warmup(langs=("ru", "en")):
+    """
+    В фоне, до первой фразы: загружает модели Piper (ONNX грузится секунды),
+    а для языков без модели - первый запрос к gTTS (DNS, TLS, токен).
+    """
+    def _run():
+        try:
+            missing = [lang for lang in langs if not get_piper_voice(lang)]
+            if missing:
+                gTTS(text="ok", lang=missing[0]).write_to_fp(io.BytesIO())
+        except Exception:
+            pass
+    threading.Thread(target=_run, daemon=True).start()
@@ -1,10 +1,26 @@
 import os
 import sys
+import json
 import time
+import queue
+import itertools
+import collections
+import threading
+import shutil
 import subprocess
 import speech_recognition as sr
-from deep_translator import GoogleTranslator
-from gtts import gTTS
+from dotenv import load_dotenv
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# .env next to the script (MIC_INDEX, MIC_DEVICE, PIPER_MODEL_*, ...); loaded before
+# the shared modules below read their settings at import
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+# Shared helpers live in ../pi_translator (tts_cache.py, translation_memory.py)
+sys.path.insert(0, os.path.join(SCRIPT_DIR, "..", "pi_translator"))
+import audio_io
+import tts_cache
+import translation_memory
+from translation_memory import translate
 
 try:
     from gpiozero import Button
@@ -12,48 +28,94 @@ try:
 except (ImportError, OSError):
     GPIO_AVAILABLE = False
 
+if GPIO_AVAILABLE:
+    # Polling fallback: imported once here, not on every press/release
+    try:
+        import RPi.GPIO as GPIO
+    except (ImportError, RuntimeError):
+        GPIO = None
+
+try:
+    # Streaming gRPC STT: results arrive while the user is still speaking.
+    # Needs a service account; without one we stay on recognize_google.
+    from google.cloud import speech
+    CLOUD_STT_AVAILABLE = bool(os.getenv("GOOGLE_APPLICATION_CREDENTIALS")) and sys.platform != "darwin"
+except ImportError:
+    CLOUD_STT_AVAILABLE = False
+
+try:
+    # Offline STT: Kaldi decodes the arecord stream as it arrives, no network round-trip
+    from vosk import Model as VoskModel, KaldiRecognizer, SetLogLevel
+    SetLogLevel(-1)
+    VOSK_AVAILABLE = sys.platform != "darwin"
+except ImportError:
+    VOSK_AVAILABLE = False
+
+try:
+    import webrtcvad  # Fast end-of-speech detection on raw arecord frames
+    VAD_AVAILABLE = sys.platform != "darwin"
+except ImportError:
+    VAD_AVAILABLE = False
+
 # --- SETTINGS ---
 BUTTON_PIN = 27          # GPIO 27 (Pin 13)
-TEMP_WAV = "input.wav"
+MIC_INDEX = int(os.getenv("MIC_INDEX")) if os.getenv("MIC_INDEX") else None  # see pi_audio_check.py
+MIC_DEVICE = os.getenv("MIC_DEVICE", "hw:1,0")  # arecord device for streaming STT
+SAMPLE_RATE = 16000
+STREAM_CHUNK_BYTES = SAMPLE_RATE * 2 // 10  # 100 ms of S16_LE mono
+VAD_FRAME_BYTES = int(SAMPLE_RATE * 0.02) * 2  # 20 ms frames
+VAD_SILENCE_FRAMES = 15  # 300 ms of silence after speech ends a phrase
+VAD_PREROLL_FRAMES = 10  # Keep 200 ms before speech onset so the first syllable isn't clipped
+# Vosk small models from https://alphacephei.com/vosk/models (a language without one uses online STT)
+VOSK_MODELS = {
+    "ru-RU": os.getenv("VOSK_MODEL_RU", os.path.join(SCRIPT_DIR, "models", "vosk-model-small-ru-0.22")),
+    "en-US": os.getenv("VOSK_MODEL_EN", os.path.join(SCRIPT_DIR, "models", "vosk-model-small-en-us-0.15")),
+}
+VOSK_CHUNK_BYTES = 4000  # 125 ms per AcceptWaveform call
 ALSA_DEVICE = "bluealsa" # For Pi Lite Bluetooth
+# Player binaries resolved once at import instead of a PATH search per utterance
+_APLAY = shutil.which("aplay") or "aplay"
+_AFPLAY = shutil.which("afplay") or "afplay"
 
-def speak(text, lang):
-    """Synthesizes speech and plays it using robust Pi logic."""
-    mp3_filename = "output_tts.mp3"
-    wav_filename = "output_tts.wav"
+_speak_lock = threading.Lock()
 
-    try:
-        tts = gTTS(text=text, lang=lang)
-        tts.save(mp3_filename)
-        
-        if sys.platform == "darwin": # macOS
-            subprocess.run(['afplay', mp3_filename], check=True)
-        else: # Linux (Raspberry Pi)
-            # 1. Convert to WAV
-            subprocess.run(["ffmpeg", "-y", "-i", mp3_filename, wav_filename],
-                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+def speak(text, lang):
+    """Speaks with Piper when a voice model exists, else from the on-disk gTTS cache."""
+    with _speak_lock:  # Announcements and translations queue up instead of overlapping
+        try:
+            voice = tts_cache.get_piper_voice(lang) if sys.platform != "darwin" else None
+            if voice: # Linux, offline: no network round-trip at all
+                tts_cache.play_piper(text, voice, ALSA_DEVICE)
+                return
+        except Exception as e:
+            print(f"⚠️ Piper Error: {e}. Falling back to gTTS.")
+        try:
+            if sys.platform == "darwin": # macOS
+                subprocess.run([_AFPLAY, tts_cache.get_mp3(text, lang)], check=True)
+            elif tts_cache.MINIAUDIO_AVAILABLE: # Linux: resident aplay, BlueALSA stays open
+                tts_cache.play_resident(text, lang, ALSA_DEVICE)
+            elif not tts_cache.is_cached(text, lang): # Linux, new phrase
+                # gTTS MP3 streams straight into mpg123 (and into the cache): no temp files
+                tts_cache.stream(text, lang, ALSA_DEVICE)
+            else: # Linux, cached phrase
+                wav_filename = tts_cache.get_or_synth(text, lang)
             
-            # 2. Play via BlueALSA
-            try:
-                subprocess.run(['aplay', '-D', ALSA_DEVICE, wav_filename], 
-                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-            except:
-                subprocess.run(['aplay', wav_filename], 
-                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-
-    except Exception as e:
-        print(f"❌ TTS Error: {e}")
-    finally:
-        if os.path.exists(mp3_filename): os.remove(mp3_filename)
-        if os.path.exists(wav_filename): os.remove(wav_filename)
+                # Play via BlueALSA
+                try:
+                    subprocess.run([_APLAY, '-D', ALSA_DEVICE, wav_filename], 
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+                except:
+                    subprocess.run([_APLAY, wav_filename], 
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+
+        except Exception as e:
+            print(f"❌ TTS Error: {e}")
 
 def main():
     print("\n" + "="*50)
     print("   🎙️  Voice Translator (Button 2 Support)")
     print("="*50)
 
-    r = sr.Recognizer()
-    
     # Translation Modes
     modes = [
         {"in": "ru-RU", "out": "en", "label": "🇷🇺 RU -> 🇺🇸 EN"},
@@ -61,14 +123,21 @@ def main():
     ]
     current_mode_idx = 0
 
+    # Pre-synthesize the mode prompts so the first toggle is instant
+    tts_cache.prefetch([("Режим изменен", "ru"), ("Mode changed", "en")], wav=sys.platform != "darwin")
+
     def toggle_mode():
         nonlocal current_mode_idx
         current_mode_idx = (current_mode_idx + 1) % len(modes)
         mode = modes[current_mode_idx]
         print(f"\n🔄 Switched to: {mode['label']}")
-        speak("Режим изменен" if mode['out'] == 'ru' else "Mode changed", mode['out'])
+        # Announce in the background: the new mode is active right away
+        threading.Thread(
+            target=speak, args=("Режим изменен" if mode['out'] == 'ru' else "Mode changed", mode['out']), daemon=True
+        ).start()
 
-    if GPIO_AVAILABLE:
+    use_gpio = GPIO_AVAILABLE
+    if use_gpio:
         try:
             button = Button(BUTTON_PIN)
             button.when_double_clicked = toggle_mode
@@ -76,79 +145,232 @@ def main():
             print("👉 HOLD to record, DOUBLE-CLICK to toggle language.")
             USE_POLLING = False
         except Exception as e:
-            print(f"⚠️ Button error: {e}. Switching to POLLING mode.")
             button = None
-            USE_POLLING = True
+            USE_POLLING = GPIO is not None
+            if USE_POLLING:
+                print(f"⚠️ Button error: {e}. Switching to POLLING mode.")
+                # Pin setup once, before the loop
+                GPIO.setmode(GPIO.BCM)
+                GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            else:
+                # No RPi.GPIO either: same keyboard fallback as image_interpreter
+                print(f"⚠️ Button error: {e}. Use ENTER to record, D to toggle.")
+                use_gpio = False
     else:
         print("⚠️ GPIO not available. Use ENTER to record, D to toggle.")
         USE_POLLING = False
 
+    # Load Piper voices (or warm DNS/TLS for gTTS) and the translator while the mic is being set up
+    tts_cache.warmup()
+    translation_memory.warmup()
+
+    # Offline STT models, loaded once
+    vosk_models = {}
+    if VOSK_AVAILABLE:
+        for lang, path in VOSK_MODELS.items():
+            if os.path.isdir(path):
+                vosk_models[lang] = VoskModel(path)
+        if vosk_models:
+            print(f"🧠 Offline STT (Vosk): {', '.join(vosk_models)}")
+
+    # --- MICROPHONE: shared per process via audio_io, calibrated at most once ---
+    if all(m['in'] in vosk_models for m in modes):
+        pass  # Every mode is recognized offline: no online STT to set up
+    elif CLOUD_STT_AVAILABLE:
+        speech_client = speech.SpeechClient()
+        print("☁️ Streaming STT (google-cloud-speech)")
+    elif VAD_AVAILABLE:
+        print("🎧 WebRTC VAD endpointing")
+    else:
+        mic = audio_io.get_microphone(MIC_INDEX)
+        listener = audio_io.get_recognizer(MIC_INDEX)
+        listener.pause_threshold = 0.6  # A phrase is cut (and sent to STT) after 0.6 s of silence
+
+    # --- PIPELINE: listen (while held) -> STT + translate -> TTS ---
+    # Each phrase is handed to STT as soon as a pause ends it, while the button is
+    # still held, so recognition runs concurrently with recording instead of after it.
+    # One worker per stage keeps FIFO order; seq ids are for logs.
+    rec_q = queue.Queue(maxsize=2)   # (seq, AudioData or final transcript, mode)
+    tts_q = queue.Queue(maxsize=2)   # (seq, text, lang)
+    seq_ids = itertools.count(1)
+    held = threading.Event()
+
+    def listen_while_held(mode):
+        with mic as source:
+            while held.is_set():
+                try:
+                    audio = listener.listen(source, timeout=1, phrase_time_limit=15)
+                except sr.WaitTimeoutError:
+                    continue
+                # The last phrase is delivered even if the button was released mid-phrase
+                seq = next(seq_ids)
+                print(f"⏳ Translating #{seq}...")
+                rec_q.put((seq, audio, mode))
+
+    def stream_while_held(mode):
+        """Cloud STT: 100 ms chunks go up while held; each final result goes straight to translation."""
+        cmd = ["arecord", "-q", "-D", MIC_DEVICE, "-f", "S16_LE", "-r", str(SAMPLE_RATE), "-c", "1", "-t", "raw"]
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+        def audio_requests():
+            while held.is_set():
+                chunk = process.stdout.read(STREAM_CHUNK_BYTES)
+                if not chunk: break
+                yield speech.StreamingRecognizeRequest(audio_content=chunk)
+
+        # Not single_utterance: the user may say several sentences while holding the button
+        config = speech.StreamingRecognitionConfig(
+            config=speech.RecognitionConfig(
+                encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+                sample_rate_hertz=SAMPLE_RATE,
+                language_code=mode['in'],
+            ),
+            interim_results=True,
+        )
+        try:
+            for response in speech_client.streaming_recognize(config=config, requests=audio_requests()):
+                for result in response.results:
+                    if not result.alternatives: continue
+                    if result.is_final:
+                        seq = next(seq_ids)
+                        print(f"⏳ Translating #{seq}...")
+                        rec_q.put((seq, result.alternatives[0].transcript, mode))
+                    else:
+                        print(f"… {result.alternatives[0].transcript}")
+        except Exception as e:
+            print(f"❌ Streaming STT error: {e}")
+        finally:
+            process.terminate()
+            process.wait()
+
+    def vosk_while_held(mode):
+        """Offline: arecord chunks go into Kaldi as they arrive; each finished phrase goes to translation."""
+        rec = KaldiRecognizer(vosk_models[mode['in']], SAMPLE_RATE)
+        cmd = ["arecord", "-q", "-D", MIC_DEVICE, "-f", "S16_LE", "-r", str(SAMPLE_RATE), "-c", "1", "-t", "raw"]
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+        def deliver(result):
+            text = json.loads(result).get("text", "")
+            if text:
+                seq = next(seq_ids)
+                print(f"⏳ Translating #{seq}...")
+                rec_q.put((seq, text, mode))
+
+        try:
+            while held.is_set():
+                chunk = process.stdout.read(VOSK_CHUNK_BYTES)
+                if not chunk: break
+                if rec.AcceptWaveform(chunk):  # Kaldi found the end of a phrase
+                    deliver(rec.Result())
+            deliver(rec.FinalResult())  # Released mid-phrase: flush the tail
+        finally:
+            process.terminate()
+            process.wait()
+
+    def vad_while_held(mode):
+        """arecord frames through WebRTC VAD: each phrase goes to STT 300 ms after speech stops."""
+        vad = webrtcvad.Vad(3)
+        cmd = ["arecord", "-q", "-D", MIC_DEVICE, "-f", "S16_LE", "-r", str(SAMPLE_RATE), "-c", "1", "-t", "raw"]
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        preroll = collections.deque(maxlen=VAD_PREROLL_FRAMES)
+        frames, silent = [], 0
+
+        def flush():
+            seq = next(seq_ids)
+            print(f"⏳ Translating #{seq}...")
+            rec_q.put((seq, sr.AudioData(b"".join(frames), SAMPLE_RATE, 2), mode))
+
+        try:
+            while held.is_set():
+                frame = process.stdout.read(VAD_FRAME_BYTES)
+                if len(frame) < VAD_FRAME_BYTES: break
+                is_speech = vad.is_speech(frame, SAMPLE_RATE)
+                if not frames:
+                    preroll.append(frame)
+                    if is_speech:
+                        frames, silent = list(preroll), 0
+                    continue
+                frames.append(frame)
+                silent = 0 if is_speech else silent + 1
+                if silent >= VAD_SILENCE_FRAMES:
+                    flush()
+                    frames = []
+                    preroll.clear()
+            if frames:  # Released mid-phrase: send what we have
+                flush()
+        finally:
+            process.terminate()
+            process.wait()
+
+    def stt_worker():
+        r = sr.Recognizer()
+        while True:
+            seq, audio, mode = rec_q.get()
+            try:
+                # Streaming STT (cloud or Vosk) already delivers text; otherwise recognize the phrase now
+                text_in = audio if isinstance(audio, str) else r.recognize_google(audio, language=mode['in'])
+                print(f"🗣️  In #{seq}: {text_in}")
+                if text_in:
+                    translation = translate('auto', mode['out'], text_in)
+                    print(f"🌍 Out #{seq}: {translation}")
+                    # Download the TTS audio here, while the previous phrase is still playing
+                    tts_cache.fetch(translation, mode['out'])
+                    tts_q.put((seq, translation, mode['out']))
+            except sr.UnknownValueError:
+                print(f"⚠️ #{seq}: Speech not recognized.")
+            except Exception as e:
+                print(f"❌ Error #{seq}: {e}")
+
+    def tts_worker():
+        while True:
+            seq, text, lang = tts_q.get()
+            speak(text, lang)
+
+    threading.Thread(target=stt_worker, daemon=True).start()
+    threading.Thread(target=tts_worker, daemon=True).start()
+
+    listen_thread = None
     try:
         while True:
             mode = modes[current_mode_idx]
             
-            if GPIO_AVAILABLE:
+            if use_gpio:
                 if not USE_POLLING:
                     button.wait_for_press()
                 else:
-                    import RPi.GPIO as GPIO
-                    GPIO.setmode(GPIO.BCM)
-                    GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
                     while GPIO.input(BUTTON_PIN) == GPIO.HIGH:
-                        time.sleep(0.05)
+                        time.sleep(0.01)
             else:
                 cmd_in = input(f"\n[{mode['label']}] Press ENTER to record (or 'd' to toggle): ").strip().lower()
                 if cmd_in == 'd':
                     toggle_mode()
                     continue
 
-            # --- START RECORDING ---
+            # --- START LISTENING ---
+            if listen_thread:
+                listen_thread.join()  # Previous tail phrase still closing the mic
+            held.set()
+            listen_thread = threading.Thread(
+                target=vosk_while_held if mode['in'] in vosk_models
+                else stream_while_held if CLOUD_STT_AVAILABLE
+                else vad_while_held if VAD_AVAILABLE
+                else listen_while_held,
+                args=(mode,), daemon=True
+            )
+            listen_thread.start()
             print("🎤 Listening...")
-            mic_device = os.getenv("MIC_DEVICE", "hw:1,0")
-            cmd = ["arecord", "-D", mic_device, "-f", "S16_LE", "-r", "16000", "-c", "1", TEMP_WAV]
-            
-            if sys.platform == "darwin":
-                print("☁️ (Simulating recording on macOS...)")
-                time.sleep(2)
-                process = None
-            else:
-                process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
-            if GPIO_AVAILABLE:
+            if use_gpio:
                 if not USE_POLLING:
                     button.wait_for_release()
                 else:
-                    import RPi.GPIO as GPIO
                     while GPIO.input(BUTTON_PIN) == GPIO.LOW:
-                        time.sleep(0.05)
+                        time.sleep(0.01)
             else:
                 input("🎤 ЗАПИСЬ... [ENTER] Остановить")
 
-            # --- STOP RECORDING ---
-            if process:
-                process.terminate()
-                process.wait()
-            print("⏳ Translating...")
-
-            # --- STT & TRANSLATE ---
-            try:
-                if os.path.exists(TEMP_WAV):
-                    with sr.AudioFile(TEMP_WAV) as source:
-                        audio = r.record(source)
-                    text_in = r.recognize_google(audio, language=mode['in'])
-                    print(f"🗣️  In: {text_in}")
-
-                    if text_in:
-                        translator = GoogleTranslator(source='auto', target=mode['out'])
-                        translation = translator.translate(text_in)
-                        print(f"🌍 Out: {translation}")
-                        speak(translation, mode['out'])
-                else:
-                    print("⚠️ No audio recorded.")
-            except Exception as e:
-                print(f"❌ Error: {e}")
-            finally:
-                if os.path.exists(TEMP_WAV): os.remove(TEMP_WAV)
+            # --- STOP LISTENING ---
+            held.clear()
 
     except KeyboardInterrupt:
         print("\n👋 Bye!")